@@ -1,11 +1,34 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import plotly.graph_objects as go
-from dateutil.relativedelta import relativedelta
+import os
+import time
+import numpy as np
+from pricing_core import calculate_schedule, default_watcher, load_catalog
+from schedule_utils import batch_schedule, month_offsets, plan_quote
+from cache_utils import LRUCache
+from timeline_utils import (
+    MAX_DURATION_MONTHS,
+    TIMELINE_COLORS,
+    DurationTimeline,
+    build_comparison_figure,
+    build_plan_figure,
+)
+from figure_assets import FigureAssetStore, start_warmer
+from table_utils import EXPORT_FORMATS, export_table, schedule_table
+from timing_utils import StageTimings
+
+rerun_start = time.perf_counter()
 
 st.set_page_config(page_title="Test Schedule Timeline", layout="wide")
 
+@st.cache_resource
+def get_stage_timings():
+    # Recent stage timings of all sessions of this server process
+    return StageTimings()
+
+timings = get_stage_timings()
+
 st.markdown(
     """
     <style>
@@ -19,75 +42,8 @@ st.markdown(
 
 start_date = datetime.date.today()
 
-programs = {
-    'CORE HEALTH': {
-        'Test Monthly': {
-            'Pay as you go': {'price_per_panel': 225, 'period_months': 1},
-            '6-month plan': {'price_per_panel': 115, 'period_months': 1, 'duration_months': 6},
-            '12-month plan': {'price_per_panel': 99, 'period_months': 1, 'duration_months': 12},
-        },
-        'Test Quarterly': {
-            'Pay as you go': {'price_per_panel': 225, 'period_months': 3},
-            '6-month plan': {'price_per_panel': 165, 'period_months': 3, 'duration_months': 6},
-            '12-month plan': {'price_per_panel': 135, 'period_months': 3, 'duration_months': 12},
-        },
-        'Every 6 months': {
-            'Pay as you go': {'price_per_panel': 225, 'period_months': 6},
-            '12-month plan': {'price_per_panel': 185, 'period_months': 6, 'duration_months': 12},
-            '24-month plan': {'price_per_panel': 149, 'period_months': 6, 'duration_months': 24},
-        },
-        'Just once': {
-            'One-time': {'price_per_panel': 295, 'period_months': 0, 'duration_months': 1},
-        }
-    },
-    'Heart & Metabolic Program': {
-        'Test Quarterly': {
-            'Pay as you go': {'price_per_panel': 297, 'period_months': 3},
-            '6-month plan': {'price_per_panel': 225, 'period_months': 3, 'duration_months': 6},
-            '12-month plan': {'price_per_panel': 195, 'period_months': 3, 'duration_months': 12},
-        },
-        'Every 6 months': {
-            'Pay as you go': {'price_per_panel': 297, 'period_months': 6},
-            '12-month plan': {'price_per_panel': 245, 'period_months': 6, 'duration_months': 12},
-            '24-month plan': {'price_per_panel': 220, 'period_months': 6, 'duration_months': 24},
-        },
-        'Just once': {
-            'One-time': {'price_per_panel': 345, 'period_months': 0, 'duration_months': 1},
-        }
-    },
-    'Ultimate Program': {
-        'Every 6 weeks': {
-            '6-month plan': {
-                'price_per_panel': 99,
-                'period_weeks': 6,
-                'duration_months': 6,
-                'tests_included': 4,
-                'test_details': [
-                    "Thyroid + Core Health",
-                    "Hormones",
-                    "Metabolic + Core Health)",
-                    "Minerals"
-                ]
-            },
-            '12-month plan': {
-                'price_per_panel': 85,
-                'period_weeks': 6,
-                'duration_months': 12,
-                'tests_included': 8,
-                'test_details': [
-                    "Thyroid + Core Health",
-                    "Hormones",
-                    "Metabolic + Core Health)",
-                    "Minerals",
-                    "Thyroid + Core Health",
-                    "Hormones",
-                    "Metabolic + Core Health)",
-                    "Minerals"
-                ]
-            },
-        }
-    }
-}
+with timings.stage('catalog'):
+    catalog = load_catalog()
 
 st.markdown(
     "<h1 style='text-align: center; color: #FF7F50;'>🩺 Test Schedule Timeline Visualization</h1>",
@@ -96,223 +52,236 @@ st.markdown(
 
 st.sidebar.header("Select Options")
 
-program_name = st.sidebar.selectbox("Program", list(programs.keys()))
-test_frequency = st.sidebar.selectbox("Test Frequency", list(programs[program_name].keys()))
-payment_plan = st.sidebar.selectbox("Payment Plan", list(programs[program_name][test_frequency].keys()))
+program_name = st.sidebar.selectbox("Program", catalog.program_names())
+test_frequency = st.sidebar.selectbox("Test Frequency", catalog.frequencies(program_name))
+payment_plan = st.sidebar.selectbox("Payment Plan", catalog.payment_plans(program_name, test_frequency))
+
+compare_plans = st.sidebar.checkbox("Compare all plans")
 
 custom_duration = None
 
-if payment_plan.lower() == 'pay as you go':
+if catalog.get(program_name, test_frequency, payment_plan).is_pay_as_you_go or (
+    compare_plans and any(
+        catalog.get(program_name, test_frequency, plan).is_pay_as_you_go
+        for plan in catalog.payment_plans(program_name, test_frequency)
+    )
+):
     custom_duration = st.sidebar.slider(
         "Select Duration (Months)",
         min_value=1,
-        max_value=24,
+        max_value=MAX_DURATION_MONTHS,
         value=12,
         step=1
     )
 
-def calculate_schedule(program_name, test_frequency, payment_plan, custom_duration=None):
-    plan = programs[program_name][test_frequency][payment_plan]
-    duration_months = plan.get('duration_months')
-    period_months = plan.get('period_months')
-    period_weeks = plan.get('period_weeks')
-    price_per_panel = plan['price_per_panel']
-    tests_included = plan.get('tests_included')
-    test_details = plan.get('test_details', [])
-
-    if custom_duration is not None:
-        duration_months = custom_duration
-
-    test_dates = []
-
-    if period_months:
-        if period_months == 0:
-            test_dates = [start_date]
-        else:
-            num_tests = duration_months // period_months
-            for i in range(num_tests):
-                test_date = start_date + relativedelta(months=period_months * i)
-                if test_date <= start_date + relativedelta(months=duration_months):
-                    test_dates.append(test_date)
-    elif period_weeks:
-        if period_weeks == 0:
-            test_dates = [start_date]
-        else:
-            if tests_included:
-                num_tests = tests_included
-            else:
-                num_tests = int((duration_months * 4.34524) // period_weeks)
-            for i in range(1, num_tests + 1):
-                test_date = start_date + relativedelta(weeks=period_weeks * i)
-                if test_date <= start_date + relativedelta(months=duration_months):
-                    test_dates.append(test_date)
-    else:
-        test_dates = []
-
-    total_months = duration_months
-    all_months = [
-        (start_date + relativedelta(months=i)).strftime('%b').upper()
-        for i in range(total_months + 1)
-    ]
-
-    return test_dates, price_per_panel, all_months, duration_months, test_details
-
-def get_month_offset(start_date, test_date):
-    delta = test_date - start_date
-    return delta.days / 30.4375
-
-def get_year_boundaries(start_date, duration_months):
-    boundaries = {}
-    current_year = start_date.year
-    for month in range(1, duration_months + 1):
-        date = start_date + relativedelta(months=month)
-        if date.month == 1:
-            boundaries[current_year + 1] = month
-            current_year += 1
-    return boundaries
-
-test_dates, price_per_panel, all_months, duration_months, test_details = calculate_schedule(
-    program_name, test_frequency, payment_plan, custom_duration
-)
-
-year_boundaries = get_year_boundaries(start_date, duration_months)
-
-fig = go.Figure()
+colors = TIMELINE_COLORS
 
-colors = {
-    'background': '#FDF5E6',
-    'timeline': '#FF7F50',
-    'month_markers': '#2E8B57',
-    'test_markers': '#FF4500',
-    'arrow_color': 'blue',
-    'text': '#333333'
-}
-
-fig.add_shape(
-    type="line",
-    x0=-0.5, y0=0, x1=len(all_months)-0.5, y1=0,
-    line=dict(color=colors['timeline'], width=10)
-)
+# Memory cap of the shared timeline cache
+TIMELINE_CACHE_MB = int(os.environ.get('TIMELINE_CACHE_MB', 256))
 
-for i, month in enumerate(all_months):
-    fig.add_trace(go.Scatter(
-        x=[i], y=[0],
-        mode='markers+text',
-        marker=dict(size=20, color=colors['month_markers'], symbol='circle'),
-        text=month,
-        textposition='bottom center',
-        textfont=dict(size=14, color=colors['text']),
-        hoverinfo='none'
-    ))
-
-for year, month_index in year_boundaries.items():
-    fig.add_shape(
-        type="line",
-        x0=month_index - 0.5, y0=-0.5, x1=month_index - 0.5, y1=1.5,
-        line=dict(color='gray', width=2, dash='dash')
+@st.cache_resource
+def get_timeline_cache():
+    # Shared by all sessions of this server process: sessions asking for the same timeline at once
+    # wait for the one computing it rather than computing it again
+    cache = LRUCache(maxsize=256, max_bytes=TIMELINE_CACHE_MB * 1024 * 1024)
+    # Entries are keyed by the fingerprints of the plans they show: when the programs file changes,
+    # drop the ones built from plans that no longer exist as they were
+    default_watcher().subscribe(
+        lambda old, new, changed_keys: cache.invalidate(lambda key: not new.fingerprints.issuperset(key[0]))
     )
-    fig.add_annotation(
-        x=month_index - 0.5, y=1.6,
-        text=str(year),
-        showarrow=False,
-        font=dict(size=12, color='gray'),
-        xanchor='center',
-        yanchor='bottom'
+    return cache
+
+@st.cache_resource
+def get_asset_store(start_date):
+    # Once per server process and start date, in the background: drop the figures of past days and
+    # prebuild today's at the default duration. Other figures are saved as sessions build them
+    store = FigureAssetStore()
+    start_warmer(store, catalog, start_date, colors)
+    return store
+
+asset_store = get_asset_store(start_date)
+
+def shared(stage, key, compute):
+    # Looks `key` up in the shared cache, recording whether this session had to compute it
+    computed = []
+    def compute_once():
+        computed.append(True)
+        return compute()
+    value = get_timeline_cache().get_or_compute(key, compute_once)
+    stage['cache_hit'] = int(not computed)
+    return value
+
+def figure_metrics(fig):
+    return {'traces': len(fig.data), 'shapes': len(fig.layout.shapes), 'payload_bytes': len(fig.to_json())}
+
+def finish_rerun():
+    timings.record('rerun', time.perf_counter() - rerun_start)
+
+    # Hidden panel, open the app with ?debug=1
+    if st.query_params.get('debug') != '1':
+        return
+    with st.expander("Debug: stage timings", expanded=True):
+        st.dataframe(pd.DataFrame.from_dict(timings.summary(), orient='index'), use_container_width=True)
+        st.dataframe(pd.DataFrame(timings.records()[::-1]), use_container_width=True, hide_index=True)
+        st.dataframe(pd.DataFrame([get_timeline_cache().stats()], index=['timeline cache']), use_container_width=True)
+        st.download_button("Download JSON", timings.to_json(), file_name="stage_timings.json", mime="application/json")
+        st.download_button(
+            "Download Prometheus",
+            timings.to_prometheus() + get_timeline_cache().to_prometheus('timeline'),
+            file_name="stage_timings.prom",
+            mime="text/plain"
+        )
+        if st.button("Clear timings"):
+            timings.clear()
+
+def build_comparison(program_name, test_frequency, custom_duration, start_date):
+    plans = [catalog.get(program_name, test_frequency, plan) for plan in catalog.payment_plans(program_name, test_frequency)]
+    num_plans = len(plans)
+    # One batched schedule for every plan of the frequency
+    with timings.stage('comparison schedule', plans=num_plans) as stage:
+        schedule = batch_schedule(
+            catalog,
+            [start_date] * num_plans,
+            [program_name] * num_plans,
+            [test_frequency] * num_plans,
+            [plan.payment_plan for plan in plans],
+            [custom_duration if plan.is_pay_as_you_go else None for plan in plans]
+        )
+        stage['tests'] = len(schedule.test_dates)
+    test_offsets = month_offsets(np.datetime64(start_date, 'D'), schedule.test_dates)
+
+    with timings.stage('comparison figure') as stage:
+        fig = build_comparison_figure(
+            start_date,
+            plan_labels=[plan.payment_plan for plan in plans],
+            duration_months=int(schedule.duration_months.max()),
+            test_rows=schedule.test_row.tolist(),
+            test_offsets=test_offsets.tolist(),
+            test_texts=[f"${price:g}" for price in schedule.test_prices],
+            test_hovertexts=[date.strftime('%B %d, %Y') for date in schedule.test_dates.tolist()],
+            colors=colors
+        )
+        fig.update_layout(
+            title=dict(
+                text=f"{program_name} - {test_frequency} - All plans",
+                font=dict(size=24, color=colors['text']),
+                x=0.5
+            )
+        )
+        stage.update(figure_metrics(fig))
+
+    costs = pd.DataFrame({
+        'Payment Plan': [plan.payment_plan for plan in plans],
+        'Price per panel': schedule.price_per_panel,
+        'Duration (months)': schedule.duration_months,
+        'Tests': schedule.num_tests,
+        'Total cost': schedule.total_cost,
+    })
+    return fig, costs
+
+if compare_plans:
+    fingerprints = tuple(
+        catalog.get(program_name, test_frequency, plan).fingerprint
+        for plan in catalog.payment_plans(program_name, test_frequency)
     )
+    comparison_key = (fingerprints, 'compare', program_name, test_frequency, custom_duration, start_date)
+    with timings.stage('comparison') as stage:
+        fig, costs = shared(stage, comparison_key, lambda: build_comparison(*comparison_key[2:]))
+    with timings.stage('plotly_chart', traces=len(fig.data), shapes=len(fig.layout.shapes)):
+        st.plotly_chart(fig, use_container_width=True)
+    with timings.stage('costs table', rows=len(costs)):
+        st.dataframe(
+            costs,
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                'Price per panel': st.column_config.NumberColumn(format="$%.2f"),
+                'Total cost': st.column_config.NumberColumn(format="$%.2f"),
+            }
+        )
+    finish_rerun()
+    st.stop()
 
-for idx, date in enumerate(test_dates):
-    month_offset = get_month_offset(start_date, date)
-    if month_offset >= len(all_months):
-        additional_months = int(month_offset - len(all_months) + 1)
-        for j in range(additional_months):
-            new_month = (start_date + relativedelta(months=len(all_months)+j)).strftime('%b').upper()
-            all_months.append(new_month)
-            fig.add_trace(go.Scatter(
-                x=[len(all_months)-1 + j], y=[0],
-                mode='markers+text',
-                marker=dict(size=20, color=colors['month_markers'], symbol='circle'),
-                text=new_month,
-                textposition='bottom center',
-                textfont=dict(size=14, color=colors['text']),
-                hoverinfo='none'
-            ))
-        fig.add_shape(
-            type="line",
-            x0=len(all_months)-1, y0=0, x1=len(all_months)-1, y1=0,
-            line=dict(color=colors['timeline'], width=10)
+def build_schedule(program_name, test_frequency, payment_plan, custom_duration, start_date):
+    plan = catalog.get(program_name, test_frequency, payment_plan)
+    test_dates, price_per_panel, _, duration_months, test_details = calculate_schedule(
+        program_name, test_frequency, payment_plan, custom_duration, start_date, catalog
+    )
+    # Kept columnar for display and download
+    return schedule_table(test_dates, plan.rotation(len(test_dates))[1], test_details), price_per_panel, duration_months
+
+def build_timeline(program_name, test_frequency, payment_plan, custom_duration, start_date):
+    plan = catalog.get(program_name, test_frequency, payment_plan)
+    with timings.stage('schedule') as stage:
+        schedule, price_per_panel, duration_months = build_schedule(
+            program_name, test_frequency, payment_plan, custom_duration, start_date
         )
-        year_boundaries = get_year_boundaries(start_date, duration_months)
-        for year, month_index in year_boundaries.items():
-            if month_index - 0.5 not in [shape['x0'] for shape in fig.layout.shapes if shape['type'] == 'line']:
-                fig.add_shape(
-                    type="line",
-                    x0=month_index - 0.5, y0=-0.5, x1=month_index - 0.5, y1=1.5,
-                    line=dict(color='gray', width=2, dash='dash')
-                )
-                fig.add_annotation(
-                    x=month_index - 0.5, y=1.6,
-                    text=str(year),
-                    showarrow=False,
-                    font=dict(size=12, color='gray'),
-                    xanchor='center',
-                    yanchor='bottom'
-                )
-    if month_offset < len(all_months):
-        if program_name == 'Ultimate Program':
-            if idx < len(test_details):
-                test_detail = test_details[idx]
-            else:
-                test_detail = ""
-            text = f"🧰 ${price_per_panel}\n {test_detail}"
-        else:
-            text = f"🧰"
-
-        fig.add_trace(go.Scatter(
-            x=[month_offset], y=[1],
-            mode='markers+text',
-            marker=dict(size=15, color=colors['test_markers'], symbol='triangle-down'),
-            text=[text],
-            textposition='bottom center',
-            textfont=dict(size=12, color=colors['text']),
-            hoverinfo='text',
-            hovertext=[date.strftime('%B %d, %Y')]
-        ))
-
-fig.update_layout(
-    title=dict(
-        text=f"{program_name} - {test_frequency} - {payment_plan}",
-        font=dict(size=24, color=colors['text']),
-        x=0.5
-    ),
-    showlegend=False,
-    height=600,
-    plot_bgcolor=colors['background'],
-    paper_bgcolor=colors['background'],
-    xaxis=dict(
-        showticklabels=True,
-        showgrid=False,
-        zeroline=False,
-        range=[-0.5, len(all_months)-0.5],
-        fixedrange=True
-    ),
-    yaxis=dict(
-        showticklabels=False,
-        showgrid=False,
-        zeroline=False,
-        range=[-1, 2],
-        fixedrange=True
-    ),
-    dragmode=False,
-    margin=dict(l=20, r=20, t=100, b=20)
+        stage['tests'] = schedule.num_rows
+
+    # Prebuilt figure if the warmer or another server process already made it
+    with timings.stage('figure load') as stage:
+        fig = asset_store.load(plan, custom_duration, start_date)
+        stage['found'] = int(fig is not None)
+    if fig is None:
+        with timings.stage('figure build') as stage:
+            fig = build_plan_figure(
+                catalog, program_name, test_frequency, payment_plan, custom_duration, start_date, colors
+            )
+            stage.update(figure_metrics(fig))
+        asset_store.save(plan, custom_duration, start_date, fig)
+
+    return schedule, price_per_panel, duration_months, fig
+
+plan = catalog.get(program_name, test_frequency, payment_plan)
+last_view = st.session_state.get('last_view')
+st.session_state.last_view = (plan.fingerprint, start_date, custom_duration)
+slider_moved = plan.is_pay_as_you_go and last_view is not None and (
+    last_view[:2] == (plan.fingerprint, start_date) and last_view[2] != custom_duration
 )
+duration_timeline = st.session_state.get('duration_timeline')
+if duration_timeline is not None and (duration_timeline.plan, duration_timeline.start_date) != (plan, start_date):
+    # Only kept while the session drags the slider of the same plan
+    del st.session_state.duration_timeline
+    duration_timeline = None
+
+if slider_moved:
+    # The session keeps its own figure of the plan while the slider moves and patches it rather than
+    # fetching a whole new one; every other rerun takes the shared figure below
+    if duration_timeline is None:
+        with timings.stage('figure build') as stage:
+            duration_timeline = DurationTimeline(catalog, plan, start_date, custom_duration, colors)
+            stage.update(figure_metrics(duration_timeline.fig))
+        st.session_state.duration_timeline = duration_timeline
+    else:
+        with timings.stage('figure patch') as stage:
+            changes = duration_timeline.set_duration(custom_duration)
+            stage.update(
+                (f'{name}_{action}', count)
+                for name, counts in changes.items() for action, count in zip(('removed', 'added'), counts)
+            )
+    schedule_key = ((plan.fingerprint,), 'schedule', program_name, test_frequency, payment_plan, custom_duration,
+                    start_date)
+    with timings.stage('schedule') as stage:
+        schedule, price_per_panel, duration_months = shared(
+            stage, schedule_key, lambda: build_schedule(*schedule_key[2:])
+        )
+    fig = duration_timeline.fig
+else:
+    fingerprints = (plan.fingerprint,)
+    timeline_key = (fingerprints, program_name, test_frequency, payment_plan, custom_duration, start_date)
+    with timings.stage('timeline') as stage:
+        schedule, price_per_panel, duration_months, fig = shared(
+            stage, timeline_key, lambda: build_timeline(*timeline_key[1:])
+        )
 
-st.plotly_chart(fig, use_container_width=True)
+with timings.stage('plotly_chart', traces=len(fig.data), shapes=len(fig.layout.shapes)):
+    st.plotly_chart(fig, use_container_width=True)
 
-total_cost = price_per_panel * len(test_dates)
+with timings.stage('quote'):
+    num_tests, total_cost = plan_quote(plan, start_date, duration_months)
 
 if program_name != "Ultimate Program":
-    total_cost = price_per_panel * len(test_dates)
-    st.markdown(f"<h3 style='text-align: center; color: {colors['text']};'>💰 Uproft customer pays: ${total_cost:.2f} for {duration_months} months ({len(test_dates)} tests)</h3>", unsafe_allow_html=True)
+    st.markdown(f"<h3 style='text-align: center; color: {colors['text']};'>💰 Uproft customer pays: ${total_cost:.2f} for {duration_months} months ({num_tests} tests)</h3>", unsafe_allow_html=True)
     st.markdown(f"<h3 style='text-align: center; color: {colors['text']};'>🧰 Price per panel: {price_per_panel}</h3>", unsafe_allow_html=True)
 
     st.markdown(
@@ -326,8 +295,7 @@ if program_name != "Ultimate Program":
         unsafe_allow_html=True
     )
 else:
-    plan = programs[program_name][test_frequency][payment_plan]
-    duration_months = plan.get('duration_months')
+    duration_months = plan.duration_months
     st.markdown(f"<h3 style='text-align: center; color: {colors['text']};'>💰 Customer pays: ${price_per_panel:.2f} every month for {duration_months} months </h3>", unsafe_allow_html=True)
 
     st.markdown(
@@ -343,14 +311,18 @@ else:
     
 
 if st.checkbox(":green[Show Test Schedule Data]"):
-    df = pd.DataFrame({
-        'Test Date': test_dates,
-        'Cost': [price_per_panel] * len(test_dates)
-    })
-    df_display = df.copy()
-    df_display['Test Date'] = pd.to_datetime(df_display['Test Date']).dt.strftime('%Y-%m-%d')
-    if program_name == 'Ultimate Program':
-        df_display['Test Detail'] = test_details[:len(test_dates)]
-    else:
-        df_display['Test Detail'] = ""
-    st.dataframe(df_display.reset_index(drop=True))
\ No newline at end of file
+    with timings.stage('table display', rows=schedule.num_rows):
+        st.dataframe(schedule, column_config={'Test Date': st.column_config.DateColumn(format="YYYY-MM-DD")})
+    export_format = st.radio("Export as", list(EXPORT_FORMATS), horizontal=True)
+    extension, mime = EXPORT_FORMATS[export_format]
+    with timings.stage('table export') as stage:
+        data = export_table(schedule, export_format)
+        stage['payload_bytes'] = len(data)
+    st.download_button(
+        f"Download {export_format}",
+        data,
+        file_name=f"test_schedule.{extension}",
+        mime=mime
+    )
+
+finish_rerun()
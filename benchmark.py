@@ -0,0 +1,268 @@
+"""
+Benchmarks startup, schedule generation, year boundaries, timeline figure construction, cohort projections,
+panel demand and the plan optimizer.
+
+Usage:
+    python benchmark.py [--output results.json] [--baseline baseline.json] [--quick]
+
+Every case records wall time (best and median of several runs), peak traced allocations and, for
+figures, the number of traces and the size of the serialized figure JSON. With --baseline the run
+fails (exit code 1) when a case got slower than `--time-tolerance` allows (ignoring differences
+below `--min-delta-ms`), allocates more than `--alloc-tolerance` allows, or produces more traces
+or a bigger payload than the baseline.
+
+The results of a full run are committed as benchmark_baseline.json. Check a change against them with
+
+    python benchmark.py --baseline benchmark_baseline.json
+
+on an otherwise idle machine: wall times only compare on hardware like the one that recorded them,
+so record a new baseline with --output when the machine changes or a slowdown is accepted. The
+figure sizes do not depend on the machine, and tests/test_benchmark.py checks them against the
+baseline on every test run.
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from pricing_core import PricingCatalog, calculate_schedule, get_year_boundaries, load_catalog
+from cohort_utils import cohort_projection, signup_curve
+from optimizer_utils import PlanOptimizer
+from schedule_utils import batch_panel_demand, batch_schedule
+from timeline_utils import TIMELINE_COLORS, build_plan_figure
+
+START_DATE = datetime.date(2024, 10, 10)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+SYNTHETIC_PANELS = ['Panel A', 'Panel B', 'Panel C', 'Panel D']
+
+
+def synthetic_programs(num_programs=10, num_frequencies=4):
+    """
+    Catalog with num_programs * num_frequencies * 3 plans, mixing month and week periods. The 24-month
+    plans rotate over four panels, one of them priced on its own.
+    """
+    programs = {}
+    for p in range(num_programs):
+        frequencies = {}
+        for f in range(num_frequencies):
+            if f % 2:
+                base = {'period_weeks': 2 + f}
+            else:
+                base = {'period_months': 1 + f}
+            frequencies[f'Frequency {f}'] = {
+                'Pay as you go': dict(base, price_per_panel=200 + p),
+                '12-month plan': dict(base, price_per_panel=150 + p, duration_months=12),
+                '24-month plan': dict(
+                    base, price_per_panel=120 + p, duration_months=24, test_details=SYNTHETIC_PANELS,
+                    panel_prices={SYNTHETIC_PANELS[-1]: 90 + p}
+                ),
+            }
+        programs[f'Program {p}'] = frequencies
+    return programs
+
+
+def schedule(plan, duration_months):
+    return calculate_schedule(*plan.key, duration_months, START_DATE)
+
+
+def build_timeline(catalog, plan, duration_months):
+    """
+    Same figure as build_timeline in app.py builds when no prebuilt one is found.
+    """
+    custom_duration = duration_months if plan.is_pay_as_you_go else None
+    return build_plan_figure(catalog, *plan.key, custom_duration, START_DATE, TIMELINE_COLORS)
+
+
+def measure(func, repeat):
+    """
+    Returns timing and allocation metrics of `func()`, plus its last result.
+    """
+    # Warm-up run, so caches and lazy imports don't count against the first case
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    metrics = {
+        'best_ms': min(timings) * 1000,
+        'median_ms': statistics.median(timings) * 1000,
+        'peak_alloc_kb': peak / 1024,
+    }
+    return metrics, result
+
+
+def figure_metrics(fig):
+    return {'traces': len(fig.data), 'payload_bytes': len(fig.to_json())}
+
+
+def import_time(module, repeat):
+    """
+    Best time to import `module` in a fresh interpreter, in the same format as measure().
+    """
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    timings = [
+        float(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout)
+        for _ in range(repeat)
+    ]
+    return {
+        'best_ms': min(timings) * 1000,
+        'median_ms': statistics.median(timings) * 1000,
+        'peak_alloc_kb': 0.0,
+    }
+
+
+def figure_cases(catalog, quick=False):
+    """
+    (case name, plan, duration) of every figure case: each plan of the real catalog at its own duration
+    (pay as you go at 12 months, the slider default), then pay as you go over the slider range and beyond.
+    """
+    cases = []
+    for plan in catalog:
+        duration = 12 if plan.is_pay_as_you_go else plan.duration_months
+        cases.append((f"figure: {' / '.join(plan.key)}", plan, duration))
+    pay_as_you_go = catalog.get('CORE HEALTH', 'Test Monthly', 'Pay as you go')
+    for duration in (1, 6, 12, 24) if quick else range(1, 121):
+        cases.append((f'figure: pay as you go {duration} months', pay_as_you_go, duration))
+    return cases
+
+
+def run_cases(quick=False):
+    repeat = 3 if quick else 10
+    catalog = load_catalog()
+    results = {}
+
+    # Startup cost of the pure core and of the vectorized engine
+    for module in ('pricing_core', 'schedule_utils'):
+        results[f'startup: import {module}'] = import_time(module, repeat)
+
+    # Every plan of the real catalog at its own duration (pay as you go at 12 months, the slider default)
+    for plan in catalog:
+        duration = 12 if plan.is_pay_as_you_go else plan.duration_months
+        results[f"schedule: {' / '.join(plan.key)}"], _ = measure(lambda: schedule(plan, duration), repeat)
+
+    # Year boundaries over the slider range and beyond
+    for duration in (1, 6, 12, 24) if quick else range(1, 121):
+        results[f'year boundaries: {duration} months'], _ = measure(
+            lambda: get_year_boundaries(START_DATE, duration), repeat
+        )
+
+    # Timeline figures
+    for name, plan, duration in figure_cases(catalog, quick):
+        metrics, fig = measure(lambda: build_timeline(catalog, plan, duration), repeat)
+        results[name] = dict(metrics, **figure_metrics(fig))
+
+    # Synthetic catalogs
+    for num_programs in (10, 40):
+        programs = synthetic_programs(num_programs)
+        metrics, synthetic = measure(lambda: PricingCatalog(programs), repeat)
+        results[f'catalog load: {len(synthetic)} plans'] = metrics
+
+        records = synthetic.records
+        rng = np.random.default_rng(0)
+        rows = rng.integers(len(records), size=10_000)
+        start_dates = np.datetime64(START_DATE) + rng.integers(365, size=len(rows)).astype('timedelta64[D]')
+        args = (
+            synthetic,
+            start_dates,
+            [records[i].program_name for i in rows],
+            [records[i].test_frequency for i in rows],
+            [records[i].payment_plan for i in rows],
+            np.where([records[i].is_pay_as_you_go for i in rows], 12, np.nan)
+        )
+        results[f'batch schedule: 10k customers over {len(records)} plans'], _ = measure(
+            lambda: batch_schedule(*args), repeat
+        )
+        results[f'panel demand: 10k customers over {len(records)} plans'], _ = measure(
+            lambda: batch_panel_demand(*args), repeat
+        )
+
+        # Cost curves once per catalog and start date, then one search per change of the need
+        results[f'plan optimizer setup: {len(records)} plans'], optimizer = measure(
+            lambda: PlanOptimizer(synthetic, START_DATE), repeat
+        )
+        results[f'plan optimizer search: {len(records)} plans'], _ = measure(
+            lambda: optimizer.search(24, min_tests=8, max_gap_weeks=13), repeat
+        )
+
+    # Five years of weekly cohorts of every plan
+    keys = [plan.key for plan in catalog]
+    signups = np.tile(signup_curve(50_000, 260), (len(keys), 1))
+    results[f'cohort projection: 260 weeks x {len(keys)} plans'], _ = measure(
+        lambda: cohort_projection(catalog, START_DATE, keys, signups), repeat
+    )
+
+    return results
+
+
+def compare(results, baseline, time_tolerance, alloc_tolerance, min_delta_ms):
+    """
+    Returns a description of every metric that regressed against the baseline.
+
+    Slowdowns smaller than `min_delta_ms` are ignored as timer noise.
+    """
+    regressions = []
+    for case, metrics in results.items():
+        if case not in baseline:
+            continue
+        base = baseline[case]
+        slowdown = metrics['best_ms'] - base['best_ms']
+        if slowdown > min_delta_ms and metrics['best_ms'] > base['best_ms'] * (1 + time_tolerance):
+            regressions.append(f"{case}: {metrics['best_ms']:.2f} ms vs {base['best_ms']:.2f} ms")
+        if metrics['peak_alloc_kb'] > base['peak_alloc_kb'] * (1 + alloc_tolerance):
+            regressions.append(f"{case}: {metrics['peak_alloc_kb']:.0f} kB allocated vs {base['peak_alloc_kb']:.0f} kB")
+        for key in ('traces', 'payload_bytes'):
+            if key in base and metrics[key] > base[key]:
+                regressions.append(f"{case}: {metrics[key]} {key} vs {base[key]}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark schedule and figure construction.")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', help="Fail on regressions against this results file")
+    parser.add_argument('--time-tolerance', type=float, default=0.5, help="Allowed relative slowdown")
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help="Slowdowns below this are noise")
+    parser.add_argument('--alloc-tolerance', type=float, default=0.2, help="Allowed relative allocation growth")
+    parser.add_argument('--quick', action='store_true', help="Fewer cases and repeats")
+    args = parser.parse_args(argv)
+
+    results = run_cases(args.quick)
+    for case, metrics in results.items():
+        line = f"{case:70s} {metrics['best_ms']:9.3f} ms {metrics['peak_alloc_kb']:9.1f} kB"
+        if 'traces' in metrics:
+            line += f" {metrics['traces']:4d} traces {metrics['payload_bytes']:8d} B"
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(
+                results, json.load(f), args.time_tolerance, args.alloc_tolerance, args.min_delta_ms
+            )
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
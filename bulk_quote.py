@@ -0,0 +1,159 @@
+"""
+Prices a file of customers without starting Streamlit.
+
+Usage:
+    python bulk_quote.py customers.csv quotes.csv [--chunksize 100000] [--totals-only]
+
+The input (CSV or Parquet) needs the columns customer_id, program, frequency, plan, start_date and
+duration. An empty duration keeps the plan's own duration; pay-as-you-go plans need one. The output
+(CSV or Parquet, picked from the extension) has one row per customer with its number of tests,
+total cost and test dates; with --totals-only the dates are skipped and the counts are computed in
+closed form. Files are processed in chunks, so memory stays flat for any input size.
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from pricing_core import load_catalog
+from schedule_utils import batch_schedule, batch_totals
+
+INPUT_COLUMNS = ['customer_id', 'program', 'frequency', 'plan', 'start_date', 'duration']
+OUTPUT_COLUMNS = [
+    'customer_id', 'program', 'frequency', 'plan', 'start_date',
+    'duration_months', 'num_tests', 'price_per_panel', 'total_cost', 'test_dates'
+]
+
+
+def _is_parquet(path):
+    return path.lower().endswith(('.parquet', '.pq'))
+
+
+def read_chunks(path, chunksize):
+    """
+    Yields the input file as DataFrames of at most `chunksize` rows.
+    """
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=INPUT_COLUMNS):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(
+            path,
+            usecols=INPUT_COLUMNS,
+            dtype={'customer_id': str, 'program': str, 'frequency': str, 'plan': str, 'start_date': str},
+            chunksize=chunksize
+        )
+
+
+def quote_chunk(catalog, chunk, totals_only=False):
+    """
+    Prices one chunk of customers. Returns the quotes and the schedule they were computed from.
+
+    With `totals_only` the test counts are computed in closed form and no schedule is returned.
+    """
+    start_dates = pd.to_datetime(chunk['start_date'], format='ISO8601')
+    schedule = (batch_totals if totals_only else batch_schedule)(
+        catalog,
+        start_dates.to_numpy(dtype='datetime64[D]'),
+        chunk['program'].to_numpy(),
+        chunk['frequency'].to_numpy(),
+        chunk['plan'].to_numpy(),
+        pd.to_numeric(chunk['duration']).to_numpy(dtype=np.float64)
+    )
+    quotes = pd.DataFrame({
+        'customer_id': chunk['customer_id'].to_numpy(),
+        'program': chunk['program'].to_numpy(),
+        'frequency': chunk['frequency'].to_numpy(),
+        'plan': chunk['plan'].to_numpy(),
+        'start_date': start_dates.dt.strftime('%Y-%m-%d').to_numpy(),
+        'duration_months': schedule.duration_months,
+        'num_tests': schedule.num_tests,
+        'price_per_panel': schedule.price_per_panel,
+        'total_cost': schedule.total_cost,
+    })
+    return quotes, None if totals_only else schedule
+
+
+class CsvQuoteWriter:
+    def __init__(self, path):
+        self.path = path
+        self.header = True
+
+    def write(self, quotes, schedule):
+        if schedule is not None:
+            quotes = self._with_test_dates(quotes, schedule)
+        quotes.to_csv(self.path, mode='w' if self.header else 'a', header=self.header, index=False)
+        self.header = False
+
+    @staticmethod
+    def _with_test_dates(quotes, schedule):
+        # Test dates are written as one ';'-separated column
+        date_strings = np.datetime_as_string(schedule.test_dates, unit='D').tolist()
+        ends = np.cumsum(schedule.num_tests).tolist()
+        starts = [0] + ends[:-1]
+        return quotes.assign(test_dates=[';'.join(date_strings[a:b]) for a, b in zip(starts, ends)])
+
+    def close(self):
+        if self.header:
+            # Empty input: still write the header
+            pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(self.path, index=False)
+
+
+class ParquetQuoteWriter:
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def write(self, quotes, schedule):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(quotes, preserve_index=False)
+        if schedule is not None:
+            # Test dates are written as a list<date32> column, sliced straight out of the schedule
+            offsets = np.concatenate([[0], np.cumsum(schedule.num_tests)]).astype(np.int32)
+            test_dates = pa.ListArray.from_arrays(pa.array(offsets), pa.array(schedule.test_dates))
+            table = table.append_column('test_dates', test_dates)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def run(input_path, output_path, chunksize=100_000, totals_only=False):
+    """
+    Streams `input_path` through the schedule engine into `output_path`. Returns the number of customers.
+    """
+    catalog = load_catalog()
+    writer = ParquetQuoteWriter(output_path) if _is_parquet(output_path) else CsvQuoteWriter(output_path)
+    num_customers = 0
+    try:
+        for chunk in read_chunks(input_path, chunksize):
+            quotes, schedule = quote_chunk(catalog, chunk, totals_only)
+            writer.write(quotes, schedule)
+            num_customers += len(quotes)
+    finally:
+        writer.close()
+    return num_customers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Price a CSV/Parquet file of customers.")
+    parser.add_argument('input', help="CSV or Parquet file with one customer per row")
+    parser.add_argument('output', help="CSV or Parquet file to write the quotes to")
+    parser.add_argument('--chunksize', type=int, default=100_000, help="Rows processed at a time")
+    parser.add_argument('--totals-only', action='store_true', help="Only write test counts and totals, not the dates")
+    args = parser.parse_args(argv)
+
+    num_customers = run(args.input, args.output, args.chunksize, args.totals_only)
+    print(f"Priced {num_customers} customers into {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
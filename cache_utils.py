@@ -0,0 +1,192 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    """
+    Approximate memory held by a cached value, in bytes.
+
+    Arrays and Arrow tables report their buffers, DataFrames their deep memory usage and Plotly
+    figures their JSON payload; tuples, lists and dicts add up their items.
+    """
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if hasattr(value, 'memory_usage'):
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, 'to_json'):
+        return len(value.to_json())
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class _Flight:
+    """
+    One computation in progress, shared by every caller of its key.
+    """
+
+    __slots__ = ('done', 'value', 'error', 'completed', 'stale')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.completed = False
+        self.stale = False
+
+
+class LRUCache:
+    """
+    Thread-safe bounded cache that evicts the least recently used entry and counts hits and misses.
+
+    Misses are single-flight: while a key is being computed, other callers of the same key wait for
+    that result (or exception) instead of computing it again. Entries are capped by number
+    (`maxsize`) and, if `max_bytes` is given, by their total size as measured by `sizeof`; a value
+    bigger than `max_bytes` on its own is returned but not kept.
+    """
+
+    def __init__(self, maxsize=128, max_bytes=None, sizeof=estimate_size):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+        self.rejected = 0
+        self.errors = 0
+        self.nbytes = 0
+        self.compute_seconds = 0.0
+        self.wait_seconds = 0.0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached value for `key`, calling `compute()` and storing its result on a miss.
+
+        If another thread is already computing `key`, waits for it and returns its result, or raises
+        its exception. Should that thread be interrupted by anything other than an Exception (such as
+        a Streamlit rerun), a waiter computes the value itself.
+        """
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][0]
+                flight = self._flights.get(key)
+                if flight is None:
+                    self.misses += 1
+                    flight = self._flights[key] = _Flight()
+                    break
+                self.waits += 1
+
+            start = time.perf_counter()
+            flight.done.wait()
+            with self._lock:
+                self.wait_seconds += time.perf_counter() - start
+            if flight.error is not None:
+                raise flight.error
+            if flight.completed:
+                return flight.value
+
+        start = time.perf_counter()
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._flights[key]
+                self.errors += 1
+            if isinstance(e, Exception):
+                flight.error = e
+            flight.done.set()
+            raise
+        elapsed = time.perf_counter() - start
+        # Measured outside the lock, it can take a moment for figures
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+
+        with self._lock:
+            del self._flights[key]
+            self.compute_seconds += elapsed
+            if not flight.stale:
+                self._store(key, value, size)
+        flight.value = value
+        flight.completed = True
+        flight.done.set()
+        return value
+
+    def _store(self, key, value, size):
+        if self.max_bytes is not None and size > self.max_bytes:
+            self.rejected += 1
+            return
+        self._entries[key] = (value, size)
+        self.nbytes += size
+        while len(self._entries) > self.maxsize or (self.max_bytes is not None and self.nbytes > self.max_bytes):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.nbytes -= evicted_size
+            self.evictions += 1
+
+    def invalidate(self, predicate):
+        """
+        Drops every entry whose key matches `predicate(key)`. Returns the number of entries dropped.
+
+        Matching computations still in progress are handed to their waiters but not stored.
+        """
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                self.nbytes -= self._entries.pop(key)[1]
+            for key, flight in self._flights.items():
+                if predicate(key):
+                    flight.stale = True
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            for flight in self._flights.values():
+                flight.stale = True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'evictions': self.evictions,
+                'rejected': self.rejected,
+                'errors': self.errors,
+                'in_flight': len(self._flights),
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'bytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'compute_seconds': self.compute_seconds,
+                'wait_seconds': self.wait_seconds,
+            }
+
+    def to_prometheus(self, name, prefix='app'):
+        """
+        Prometheus text exposition of stats(): counters for the totals, gauges for the current state.
+        """
+        stats = self.stats()
+        counters = ('hits', 'misses', 'waits', 'evictions', 'rejected', 'errors', 'compute_seconds', 'wait_seconds')
+        lines = []
+        for key, value in stats.items():
+            if value is None:
+                continue
+            metric = f"{prefix}_cache_{key}_total" if key in counters else f"{prefix}_cache_{key}"
+            lines.append(f"# TYPE {metric} {'counter' if key in counters else 'gauge'}")
+            text = f'{value:.6g}' if isinstance(value, float) else str(value)
+            lines.append(f'{metric}{{cache="{name}"}} {text}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,77 @@
+from collections import namedtuple
+
+import numpy as np
+
+from schedule_utils import batch_schedule
+
+CohortProjection = namedtuple(
+    'CohortProjection',
+    [
+        'plan_keys',          # (program, frequency, plan) of each projection row
+        'week_starts',        # datetime64[D] first day of each projected week
+        'tests_per_week',     # Expected tests, shape (plans, weeks)
+        'month_starts',       # datetime64[D] first day of each projected calendar month
+        'tests_per_month',    # Expected tests, shape (plans, months)
+        'revenue_per_month',  # Expected revenue, shape (plans, months)
+    ]
+)
+
+
+def signup_curve(customers_per_week, num_weeks, weekly_growth=0.0):
+    """
+    New customers per signup week, starting at `customers_per_week` and growing by `weekly_growth` (0.01 = 1%) each week.
+    """
+    return customers_per_week * (1 + weekly_growth) ** np.arange(num_weeks)
+
+
+def cohort_projection(catalog, start_date, plan_keys, signups, pay_as_you_go_months=12):
+    """
+    Rolls up the tests and revenue of weekly signup cohorts.
+
+    `signups` has one row per plan of `plan_keys` and one column per signup week: customers who
+    start that plan on `start_date + 7 * week` days. Everyone in a cohort shares the same schedule,
+    so each (plan, week) cohort is scheduled once and weighted by its size. Payments are made per
+    test, and pay-as-you-go customers stay `pay_as_you_go_months` months.
+    """
+    signups = np.asarray(signups, dtype=np.float64)
+    num_plans, num_weeks = signups.shape
+    start = np.datetime64(start_date, 'D')
+
+    plans = [catalog.get(*key) for key in plan_keys]
+    cohort_starts = np.tile(start + np.arange(num_weeks) * np.timedelta64(7, 'D'), num_plans)
+    durations = np.repeat(
+        [pay_as_you_go_months if plan.is_pay_as_you_go else np.nan for plan in plans], num_weeks
+    )
+    schedule = batch_schedule(
+        catalog,
+        cohort_starts,
+        np.repeat([plan.program_name for plan in plans], num_weeks),
+        np.repeat([plan.test_frequency for plan in plans], num_weeks),
+        np.repeat([plan.payment_plan for plan in plans], num_weeks),
+        durations
+    )
+
+    customers = signups.ravel()[schedule.test_row]
+    test_plan = schedule.test_row // num_weeks
+
+    # Projection windows run until the last test of the last cohort
+    test_week = (schedule.test_dates - start).astype(np.int64) // 7
+    test_month = (schedule.test_dates.astype('datetime64[M]') - start.astype('datetime64[M]')).astype(np.int64)
+    last_cohort_end = start + np.timedelta64(7 * (num_weeks - 1), 'D')
+    last_month = (last_cohort_end.astype('datetime64[M]') - start.astype('datetime64[M]')).astype(np.int64)
+    total_weeks = max(num_weeks, int(test_week.max(initial=-1)) + 1)
+    total_months = max(int(last_month) + 1, int(test_month.max(initial=-1)) + 1)
+
+    def roll_up(bucket, num_buckets, weights):
+        return np.bincount(
+            test_plan * num_buckets + bucket, weights=weights, minlength=num_plans * num_buckets
+        ).reshape(num_plans, num_buckets)
+
+    return CohortProjection(
+        plan_keys=list(plan_keys),
+        week_starts=start + np.arange(total_weeks) * np.timedelta64(7, 'D'),
+        tests_per_week=roll_up(test_week, total_weeks, customers),
+        month_starts=(start.astype('datetime64[M]') + np.arange(total_months)).astype('datetime64[D]'),
+        tests_per_month=roll_up(test_month, total_months, customers),
+        revenue_per_month=roll_up(test_month, total_months, customers * schedule.test_prices),
+    )
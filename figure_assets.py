@@ -0,0 +1,173 @@
+"""
+Prebuilt single-plan timeline figures of app.py, stored on disk as gzipped Plotly JSON.
+
+Usage:
+    python figure_assets.py [--dir timeline_assets] [--start-date YYYY-MM-DD] [--days 1] [--prune]
+
+Builds the figure of every plan of the catalog, and of every pay-as-you-go duration of the app's
+slider, for each start date. Assets are keyed by start date and plan fingerprint, so a catalog edit
+only rebuilds the plans it touched. Run it daily (e.g. from cron) before traffic arrives.
+
+The app itself only warms today's figures at the slider's default duration (WARM_DURATIONS) in a
+background thread, after deleting the figures of past start dates; any other figure it had to
+build is saved as it is viewed, so the plans and durations people actually look at get cached.
+"""
+import argparse
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import plotly.graph_objects as go
+
+from pricing_core import load_catalog
+from timeline_utils import MAX_DURATION_MONTHS, TIMELINE_COLORS, build_plan_figure
+
+ASSET_DIR = os.environ.get(
+    'TIMELINE_ASSET_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'timeline_assets')
+)
+
+# Range of the app's duration slider
+PAY_AS_YOU_GO_DURATIONS = range(1, MAX_DURATION_MONTHS + 1)
+
+# Pay-as-you-go durations the app warms itself: the slider's default
+WARM_DURATIONS = (12,)
+
+# Bump when build_plan_figure changes, so figures of the old layout are not served
+ASSET_FORMAT = 2
+
+
+class FigureAssetStore:
+    """
+    Directory of prebuilt figures, one gzipped JSON file per (start date, plan fingerprint, duration).
+    """
+
+    def __init__(self, directory=ASSET_DIR):
+        self.directory = directory
+
+    def path(self, plan, custom_duration, start_date):
+        duration = 'plan' if custom_duration is None else f'{custom_duration}m'
+        return os.path.join(
+            self.directory, f'v{ASSET_FORMAT}', start_date.isoformat(), f'{plan.fingerprint}-{duration}.json.gz'
+        )
+
+    def load(self, plan, custom_duration, start_date):
+        """
+        Returns the stored figure, or None if it was not built yet.
+        """
+        try:
+            with gzip.open(self.path(plan, custom_duration, start_date), 'rt', encoding='utf-8') as f:
+                spec = json.loads(f.read())
+        except (OSError, EOFError, ValueError):
+            return None
+        # The JSON was written from a valid figure, so skip Plotly's (slow) property validation
+        return go.Figure(spec, _validate=False)
+
+    def save(self, plan, custom_duration, start_date, fig):
+        """
+        Writes a figure atomically, so concurrent readers never see a partial file.
+        """
+        spec = json.loads(fig.to_json())
+        # The default template is applied again when the figure is loaded, no need to store it
+        spec['layout'].pop('template', None)
+
+        path = self.path(plan, custom_duration, start_date)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                f.write(json.dumps(spec, separators=(',', ':')).encode('utf-8'))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def prune(self, before):
+        """
+        Deletes the figures of start dates before `before`, and those of older asset formats. Returns
+        the number of start dates removed.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        for name in os.listdir(self.directory):
+            if name[:1] == 'v' and name[1:].isdigit() and name != f'v{ASSET_FORMAT}':
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        format_dir = os.path.join(self.directory, f'v{ASSET_FORMAT}')
+        if not os.path.isdir(format_dir):
+            return 0
+        removed = 0
+        for name in os.listdir(format_dir):
+            if name < before.isoformat():
+                shutil.rmtree(os.path.join(format_dir, name), ignore_errors=True)
+                removed += 1
+        return removed
+
+
+def plan_variants(catalog, durations=PAY_AS_YOU_GO_DURATIONS):
+    """
+    Yields (plan, custom_duration) for every figure the app can show: each fixed-duration plan once,
+    each pay-as-you-go plan once per duration of `durations` (by default every slider duration).
+    """
+    for plan in catalog:
+        if plan.is_pay_as_you_go:
+            for duration in durations:
+                yield plan, duration
+        else:
+            yield plan, None
+
+
+def warm(store, catalog, start_date, colors=TIMELINE_COLORS, durations=PAY_AS_YOU_GO_DURATIONS):
+    """
+    Builds and saves every missing figure of `start_date`. Returns the number of figures built.
+    """
+    built = 0
+    for plan, custom_duration in plan_variants(catalog, durations):
+        if os.path.exists(store.path(plan, custom_duration, start_date)):
+            continue
+        fig = build_plan_figure(catalog, *plan.key, custom_duration, start_date, colors)
+        store.save(plan, custom_duration, start_date, fig)
+        built += 1
+    return built
+
+
+def _prune_and_warm(store, catalog, start_date, colors, durations):
+    store.prune(start_date)
+    warm(store, catalog, start_date, colors, durations)
+
+
+def start_warmer(store, catalog, start_date, colors=TIMELINE_COLORS, durations=WARM_DURATIONS):
+    """
+    In a daemon thread, deletes the figures of start dates before `start_date` and warms the ones of
+    `start_date` for `durations`. Returns the thread.
+    """
+    thread = threading.Thread(
+        target=_prune_and_warm, args=(store, catalog, start_date, colors, durations), daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prebuild the timeline figures of every plan.")
+    parser.add_argument('--dir', default=ASSET_DIR, help="Asset directory")
+    parser.add_argument('--start-date', type=datetime.date.fromisoformat, default=datetime.date.today(),
+                        help="First start date (default: today)")
+    parser.add_argument('--days', type=int, default=1, help="Number of consecutive start dates")
+    parser.add_argument('--prune', action='store_true', help="Delete the figures of earlier start dates and older formats")
+    args = parser.parse_args(argv)
+
+    store = FigureAssetStore(args.dir)
+    catalog = load_catalog()
+    if args.prune:
+        print(f"Pruned {store.prune(args.start_date)} start dates")
+    for day in range(args.days):
+        start_date = args.start_date + datetime.timedelta(days=day)
+        print(f"{start_date}: built {warm(store, catalog, start_date)} figures")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+from collections import namedtuple
+
+import numpy as np
+
+from schedule_utils import add_months, batch_schedule, batch_totals
+from timeline_utils import MAX_DURATION_MONTHS
+
+PlanOption = namedtuple(
+    'PlanOption',
+    [
+        'plan',             # Catalog PlanRecord
+        'duration_months',  # Duration the plan runs for (the plan's own, or the pay-as-you-go one)
+        'num_tests',        # Tests over the whole duration
+        'total_cost',       # Cost of these tests
+        'horizon_tests',    # Tests within the months of the need
+        'max_gap_weeks',    # Longest stretch without a test within the months of the need
+    ]
+)
+
+# Shortest possible spacing of two tests of a month-based plan, in days per month of period
+_SHORTEST_MONTH_DAYS = 28
+
+
+class PlanOptimizer:
+    """
+    Finds the cheapest plans of a catalog meeting a testing need, for customers starting on `start_date`.
+
+    Cost curves (number of tests and total cost per duration) are precomputed once for every plan,
+    over its own duration or every duration up to `max_duration_months` for pay-as-you-go plans,
+    along with the test dates of the plan's longest run. A plan's tests at a shorter duration are
+    the first ones of its longest run, so search() answers any need from these arrays without
+    scheduling anything.
+    """
+
+    def __init__(self, catalog, start_date, max_duration_months=MAX_DURATION_MONTHS):
+        self.catalog = catalog
+        self.start_date = start_date
+        self.plans = list(catalog)
+        plans = self.plans
+
+        is_pay_as_you_go = np.array([plan.is_pay_as_you_go for plan in plans], dtype=bool)
+        plan_durations = np.array([plan.duration_months or 0 for plan in plans], dtype=np.int64)
+        self.durations = np.arange(1, max(max_duration_months, plan_durations.max(initial=0)) + 1)
+        self.allowed = np.where(
+            is_pay_as_you_go[:, None],
+            self.durations[None, :] <= max_duration_months,
+            self.durations[None, :] == plan_durations[:, None]
+        )
+
+        # Cost curves over every allowed (plan, duration)
+        plan_rows, duration_columns = np.nonzero(self.allowed)
+        totals = batch_totals(
+            catalog,
+            np.full(len(plan_rows), start_date, dtype='datetime64[D]'),
+            [plans[i].program_name for i in plan_rows],
+            [plans[i].test_frequency for i in plan_rows],
+            [plans[i].payment_plan for i in plan_rows],
+            self.durations[duration_columns]
+        )
+        self.num_tests = np.zeros(self.allowed.shape, dtype=np.int64)
+        self.num_tests[plan_rows, duration_columns] = totals.num_tests
+        self.total_cost = np.full(self.allowed.shape, np.inf)
+        self.total_cost[plan_rows, duration_columns] = totals.total_cost
+
+        # Test dates of each plan's longest run, as days since the start date, grouped by plan
+        longest = np.where(is_pay_as_you_go, max_duration_months, plan_durations)
+        schedule = batch_schedule(
+            catalog,
+            np.full(len(plans), start_date, dtype='datetime64[D]'),
+            [plan.program_name for plan in plans],
+            [plan.test_frequency for plan in plans],
+            [plan.payment_plan for plan in plans],
+            longest
+        )
+        self._test_days = (schedule.test_dates - np.datetime64(start_date, 'D')).astype(np.int64)
+        self._first_test = np.cumsum(schedule.num_tests) - schedule.num_tests
+        self._span = int(self._test_days.max(initial=0)) + 1
+        # Sorted keys of every test across plans, for one searchsorted per query
+        self._test_keys = schedule.test_row * self._span + self._test_days
+        # Longest gap up to each test (the first gap runs from the start date): offsetting each plan
+        # by more than any gap lets one maximum.accumulate run over all plans at once
+        gaps = np.diff(self._test_days, prepend=0)
+        gaps[self._first_test[schedule.num_tests > 0]] = self._test_days[self._first_test[schedule.num_tests > 0]]
+        self._gap_prefix = np.maximum.accumulate(gaps + schedule.test_row * self._span) - schedule.test_row * self._span
+
+        # Closest two tests of a plan can be, to prune plans that can never be frequent enough
+        self._min_spacing_days = np.array([
+            7 * plan.period_weeks if plan.period_weeks else _SHORTEST_MONTH_DAYS * (plan.period_months or 0)
+            for plan in plans
+        ], dtype=np.int64)
+
+    def search(self, horizon_months, min_tests=1, max_gap_weeks=None, limit=10):
+        """
+        Returns the `limit` cheapest options covering `horizon_months` months with at least `min_tests`
+        tests in them and, if `max_gap_weeks` is given, never more than that many weeks without a test
+        (counted from the start date to the end of the horizon). Sorted by total cost.
+
+        Every option runs at least `horizon_months` months and has at least one test, and each plan
+        appears once, at its cheapest qualifying duration.
+        """
+        horizon_days = int(
+            (add_months(np.datetime64(self.start_date, 'D'), horizon_months) - np.datetime64(self.start_date, 'D'))
+            .astype(np.int64)
+        )
+        num_plans = len(self.plans)
+
+        # Tests of each plan's longest run within the horizon, up to and including its last day like
+        # the schedule itself (a week-based run ends with a test on its end date)
+        rows = np.arange(num_plans)
+        in_horizon = (
+            np.searchsorted(self._test_keys, rows * self._span + min(horizon_days, self._span - 1), side='right')
+            - np.searchsorted(self._test_keys, rows * self._span)
+        )
+
+        # Prune plans that cannot qualify at any duration
+        candidates = in_horizon >= min_tests
+        if max_gap_weeks is not None and horizon_days > 2 * 7 * max_gap_weeks:
+            # One test cannot cover the horizon, and two tests of the plan are always too far apart
+            candidates &= self._min_spacing_days <= 7 * max_gap_weeks
+        candidates = np.flatnonzero(candidates)
+        if not len(candidates):
+            return []
+
+        covering = self.durations >= horizon_months
+        allowed = self.allowed[candidates][:, covering]
+        num_tests = self.num_tests[candidates][:, covering]
+        horizon_tests = np.minimum(num_tests, in_horizon[candidates, None])
+        # A plan without any test over the duration (e.g. a one-time plan) is no option at $0
+        feasible = allowed & (horizon_tests >= min_tests) & (num_tests > 0)
+
+        # Longest gap with the first `horizon_tests` tests, including the stretch after the last one
+        last = self._first_test[candidates, None] + np.maximum(horizon_tests, 1) - 1
+        if len(self._test_days):
+            last = np.minimum(last, len(self._test_days) - 1)
+            gap_days = np.where(
+                horizon_tests > 0,
+                np.maximum(self._gap_prefix[last], horizon_days - self._test_days[last]),
+                horizon_days
+            )
+        else:
+            gap_days = np.full(horizon_tests.shape, horizon_days)
+        if max_gap_weeks is not None:
+            feasible &= gap_days <= 7 * max_gap_weeks
+
+        # Costs never drop with the duration, so the first cheapest column is each plan's best option
+        costs = np.where(feasible, self.total_cost[candidates][:, covering], np.inf)
+        best = np.argmin(costs, axis=1)
+        best_costs = costs[np.arange(len(candidates)), best]
+        qualifying = np.flatnonzero(np.isfinite(best_costs))
+        order = qualifying[np.lexsort((
+            -horizon_tests[qualifying, best[qualifying]],
+            best_costs[qualifying],
+        ))][:limit]
+
+        durations = self.durations[covering]
+        return [
+            PlanOption(
+                plan=self.plans[candidates[i]],
+                duration_months=int(durations[best[i]]),
+                num_tests=int(num_tests[i, best[i]]),
+                total_cost=float(best_costs[i]),
+                horizon_tests=int(horizon_tests[i, best[i]]),
+                max_gap_weeks=float(gap_days[i, best[i]] / 7),
+            )
+            for i in order
+        ]
@@ -0,0 +1,111 @@
+import streamlit as st
+import pandas as pd
+import datetime
+import numpy as np
+import plotly.graph_objects as go
+from pricing_core import load_catalog
+from cohort_utils import cohort_projection, signup_curve
+from timeline_utils import MAX_DURATION_MONTHS
+
+st.set_page_config(page_title="Cohort Projection", layout="wide")
+
+st.markdown(
+    """
+    <style>
+    .stApp {
+        background-color: #FDF5E6;
+    }
+    </style>
+    """,
+    unsafe_allow_html=True
+)
+
+colors = {
+    'background': '#FDF5E6',
+    'text': '#333333'
+}
+
+catalog = load_catalog()
+
+st.markdown(
+    "<h1 style='text-align: center; color: #FF7F50;'>📈 Cohort Projection</h1>",
+    unsafe_allow_html=True
+)
+
+st.sidebar.header("Projection")
+
+start_date = st.sidebar.date_input("First signup week", datetime.date.today())
+num_weeks = st.sidebar.slider("Signup weeks", min_value=1, max_value=260, value=52, step=1)
+weekly_growth = st.sidebar.number_input("Weekly signup growth (%)", value=0.0, step=0.5) / 100
+pay_as_you_go_months = st.sidebar.slider(
+    "Pay as you go duration (Months)",
+    min_value=1,
+    max_value=MAX_DURATION_MONTHS,
+    value=12,
+    step=1
+)
+metric = st.sidebar.radio("Show", ["Revenue per month", "Tests per month", "Lab capacity (tests per week)"])
+
+st.markdown("New customers in the first signup week, per plan:")
+signup_table = st.data_editor(
+    pd.DataFrame({
+        'Program': [plan.program_name for plan in catalog],
+        'Test Frequency': [plan.test_frequency for plan in catalog],
+        'Payment Plan': [plan.payment_plan for plan in catalog],
+        'Customers / week': [100] * len(catalog),
+    }),
+    hide_index=True,
+    use_container_width=True,
+    disabled=['Program', 'Test Frequency', 'Payment Plan'],
+    column_config={'Customers / week': st.column_config.NumberColumn(min_value=0, step=1)}
+)
+
+plan_keys = list(zip(signup_table['Program'], signup_table['Test Frequency'], signup_table['Payment Plan']))
+# One signup curve per plan, all growing at the same rate
+signups = np.outer(signup_table['Customers / week'].fillna(0).to_numpy(dtype=np.float64), signup_curve(1, num_weeks, weekly_growth))
+projection = cohort_projection(catalog, start_date, plan_keys, signups, pay_as_you_go_months)
+
+if metric == "Revenue per month":
+    x, values, hover = projection.month_starts, projection.revenue_per_month, '$%{y:,.0f}'
+elif metric == "Tests per month":
+    x, values, hover = projection.month_starts, projection.tests_per_month, '%{y:,.0f} tests'
+else:
+    x, values, hover = projection.week_starts, projection.tests_per_week, '%{y:,.0f} tests'
+
+# One stacked area per program
+program_names = signup_table['Program'].to_numpy()
+fig = go.Figure()
+for program in catalog.program_names():
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=values[program_names == program].sum(axis=0),
+        name=program,
+        mode='lines',
+        stackgroup='programs',
+        hovertemplate=hover
+    ))
+fig.update_layout(
+    title=dict(
+        text=f"{metric} - {num_weeks} signup weeks",
+        font=dict(size=24, color=colors['text']),
+        x=0.5
+    ),
+    height=600,
+    plot_bgcolor=colors['background'],
+    paper_bgcolor=colors['background'],
+    hovermode='x unified',
+    margin=dict(l=20, r=20, t=100, b=20)
+)
+st.plotly_chart(fig, use_container_width=True)
+
+peak_week = int(projection.tests_per_week.sum(axis=0).argmax())
+st.markdown(
+    f"<h3 style='text-align: center; color: {colors['text']};'>💰 Projected revenue: ${projection.revenue_per_month.sum():,.0f} "
+    f"from {projection.tests_per_month.sum():,.0f} tests</h3>",
+    unsafe_allow_html=True
+)
+st.markdown(
+    f"<h3 style='text-align: center; color: {colors['text']};'>🧪 Peak lab load: {projection.tests_per_week.sum(axis=0)[peak_week]:,.0f} tests "
+    f"in the week of {projection.week_starts[peak_week].item():%B %d, %Y}</h3>",
+    unsafe_allow_html=True
+)
@@ -0,0 +1,113 @@
+import streamlit as st
+import pandas as pd
+import datetime
+import numpy as np
+from pricing_core import load_catalog
+from bulk_quote import INPUT_COLUMNS
+from subscription_store import default_store
+from schedule_utils import add_months
+from timeline_utils import MAX_DURATION_MONTHS, build_calendar_heatmap
+
+st.set_page_config(page_title="Lab Capacity", layout="wide")
+
+st.markdown(
+    """
+    <style>
+    .stApp {
+        background-color: #FDF5E6;
+    }
+    </style>
+    """,
+    unsafe_allow_html=True
+)
+
+colors = {
+    'background': '#FDF5E6',
+    'test_markers': '#FF4500',
+    'text': '#333333'
+}
+
+catalog = load_catalog()
+
+store = default_store()
+
+st.markdown(
+    "<h1 style='text-align: center; color: #FF7F50;'>🧪 Lab Capacity</h1>",
+    unsafe_allow_html=True
+)
+
+st.sidebar.header("Subscriptions")
+
+uploaded = st.sidebar.file_uploader("Load subscriptions (CSV, bulk_quote columns)", type='csv')
+if 'loaded_files' not in st.session_state:
+    st.session_state.loaded_files = set()
+if uploaded is not None and uploaded.file_id not in st.session_state.loaded_files:
+    st.session_state.loaded_files.add(uploaded.file_id)
+    try:
+        subscriptions = pd.read_csv(
+            uploaded,
+            usecols=INPUT_COLUMNS,
+            dtype={'customer_id': str, 'program': str, 'frequency': str, 'plan': str, 'start_date': str}
+        )
+        store.add_many(
+            catalog,
+            subscriptions['customer_id'],
+            pd.to_datetime(subscriptions['start_date'], format='ISO8601').to_numpy(dtype='datetime64[D]'),
+            subscriptions['program'].to_numpy(),
+            subscriptions['frequency'].to_numpy(),
+            subscriptions['plan'].to_numpy(),
+            pd.to_numeric(subscriptions['duration']).to_numpy(dtype=np.float64)
+        )
+    except (KeyError, ValueError) as e:
+        st.sidebar.error(f"Could not load {uploaded.name}: {e}")
+
+st.sidebar.subheader("Add a subscription")
+subscription_id = st.sidebar.text_input("Subscription ID")
+program_name = st.sidebar.selectbox("Program", catalog.program_names())
+test_frequency = st.sidebar.selectbox("Test Frequency", catalog.frequencies(program_name))
+payment_plan = st.sidebar.selectbox("Payment Plan", catalog.payment_plans(program_name, test_frequency))
+start_date = st.sidebar.date_input("Start date", datetime.date.today())
+custom_duration = None
+if catalog.get(program_name, test_frequency, payment_plan).is_pay_as_you_go:
+    custom_duration = st.sidebar.slider(
+        "Select Duration (Months)",
+        min_value=1,
+        max_value=MAX_DURATION_MONTHS,
+        value=12,
+        step=1
+    )
+if st.sidebar.button("Add", disabled=not subscription_id):
+    try:
+        store.add(catalog, subscription_id, start_date, program_name, test_frequency, payment_plan, custom_duration)
+    except ValueError as e:
+        st.sidebar.error(str(e))
+
+st.sidebar.subheader("Remove a subscription")
+removed_id = st.sidebar.selectbox("Subscription", store.subscription_ids(), index=None)
+if st.sidebar.button("Remove", disabled=removed_id is None):
+    store.remove(removed_id)
+    st.rerun()
+
+first_day = st.date_input("From", datetime.date.today())
+months_shown = st.slider("Months shown", min_value=1, max_value=24, value=12, step=1)
+last_day = add_months(np.datetime64(first_day, 'D'), months_shown) - np.timedelta64(1, 'D')
+# Counted by the store in SQL over the days shown only. This replaces the incremental
+# per-day aggregator: the store is the source of truth and is queried on each run.
+days, tests = store.daily_counts(first_day, last_day)
+
+fig = build_calendar_heatmap(days, tests, colors)
+fig.update_layout(
+    title=dict(
+        text=f"Tests per day - {len(store)} subscriptions",
+        font=dict(size=24, color=colors['text']),
+        x=0.5
+    )
+)
+st.plotly_chart(fig, use_container_width=True)
+
+if tests.any():
+    busiest = int(tests.argmax())
+    summary = f"🧰 {tests.sum():,} tests, busiest day {days[busiest].item():%B %d, %Y} ({tests[busiest]:,} tests)"
+else:
+    summary = "🧰 No tests scheduled in this period"
+st.markdown(f"<h3 style='text-align: center; color: {colors['text']};'>{summary}</h3>", unsafe_allow_html=True)
@@ -0,0 +1,89 @@
+import streamlit as st
+import pandas as pd
+import datetime
+from pricing_core import load_catalog
+from optimizer_utils import PlanOptimizer
+from timeline_utils import MAX_DURATION_MONTHS
+
+st.set_page_config(page_title="Plan Finder", layout="wide")
+
+st.markdown(
+    """
+    <style>
+    .stApp {
+        background-color: #FDF5E6;
+    }
+    </style>
+    """,
+    unsafe_allow_html=True
+)
+
+colors = {
+    'background': '#FDF5E6',
+    'text': '#333333'
+}
+
+catalog = load_catalog()
+
+@st.cache_resource(max_entries=32)
+def get_optimizer(catalog_version, start_date):
+    # Cost curves are computed once per catalog version and start date, and shared by all sessions
+    return PlanOptimizer(catalog, start_date)
+
+st.markdown(
+    "<h1 style='text-align: center; color: #FF7F50;'>🔎 Plan Finder</h1>",
+    unsafe_allow_html=True
+)
+
+st.sidebar.header("Testing need")
+
+start_date = st.sidebar.date_input("Start date", datetime.date.today())
+horizon_months = st.sidebar.slider(
+    "Over (Months)",
+    min_value=1,
+    max_value=MAX_DURATION_MONTHS,
+    value=12,
+    step=1
+)
+min_tests = st.sidebar.number_input("At least this many tests", min_value=1, value=4, step=1)
+max_gap_weeks = None
+if st.sidebar.checkbox("Limit the time between tests"):
+    max_gap_weeks = st.sidebar.number_input("At most this many weeks without a test", min_value=1, value=13, step=1)
+limit = st.sidebar.slider("Options shown", min_value=1, max_value=50, value=10, step=1)
+
+options = get_optimizer(catalog.version, start_date).search(horizon_months, min_tests, max_gap_weeks, limit)
+
+if not options:
+    st.markdown(
+        f"<h3 style='text-align: center; color: {colors['text']};'>No plan meets this need</h3>",
+        unsafe_allow_html=True
+    )
+    st.stop()
+
+best = options[0]
+st.markdown(
+    f"<h3 style='text-align: center; color: {colors['text']};'>💰 Cheapest: {' - '.join(best.plan.key)}, "
+    f"${best.total_cost:,.2f} for {best.duration_months} months ({best.num_tests} tests)</h3>",
+    unsafe_allow_html=True
+)
+
+st.dataframe(
+    pd.DataFrame({
+        'Program': [option.plan.program_name for option in options],
+        'Test Frequency': [option.plan.test_frequency for option in options],
+        'Payment Plan': [option.plan.payment_plan for option in options],
+        'Duration (months)': [option.duration_months for option in options],
+        'Tests': [option.num_tests for option in options],
+        f'Tests in {horizon_months} months': [option.horizon_tests for option in options],
+        'Longest gap (weeks)': [option.max_gap_weeks for option in options],
+        'Price per panel': [option.plan.price_per_panel for option in options],
+        'Total cost': [option.total_cost for option in options],
+    }),
+    hide_index=True,
+    use_container_width=True,
+    column_config={
+        'Longest gap (weeks)': st.column_config.NumberColumn(format="%.1f"),
+        'Price per panel': st.column_config.NumberColumn(format="$%.2f"),
+        'Total cost': st.column_config.NumberColumn(format="$%.2f"),
+    }
+)
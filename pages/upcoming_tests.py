@@ -0,0 +1,83 @@
+import streamlit as st
+import pandas as pd
+import datetime
+import numpy as np
+from pricing_core import load_catalog
+from schedule_utils import add_months
+from subscription_store import default_store
+
+st.set_page_config(page_title="Upcoming Tests", layout="wide")
+
+st.markdown(
+    """
+    <style>
+    .stApp {
+        background-color: #FDF5E6;
+    }
+    </style>
+    """,
+    unsafe_allow_html=True
+)
+
+colors = {
+    'background': '#FDF5E6',
+    'text': '#333333'
+}
+
+catalog = load_catalog()
+store = default_store()
+
+st.markdown(
+    "<h1 style='text-align: center; color: #FF7F50;'>📅 Upcoming Tests</h1>",
+    unsafe_allow_html=True
+)
+
+st.sidebar.header("Tests due")
+
+first_day = st.sidebar.date_input("From", datetime.date.today())
+num_days = st.sidebar.slider("Days", min_value=1, max_value=90, value=7, step=1)
+program_name = st.sidebar.selectbox("Program", catalog.program_names(), index=None, placeholder="All programs")
+max_rows = st.sidebar.slider("Rows shown", min_value=100, max_value=10_000, value=1_000, step=100)
+last_day = first_day + datetime.timedelta(days=num_days - 1)
+
+num_tests, revenue = store.revenue(first_day, last_day, program_name)
+st.markdown(
+    f"<h3 style='text-align: center; color: {colors['text']};'>🧰 {num_tests:,} tests due from "
+    f"{first_day:%B %d} to {last_day:%B %d, %Y} (${revenue:,.2f}), {len(store):,} subscriptions</h3>",
+    unsafe_allow_html=True
+)
+
+due = store.tests_due(first_day, last_day, program_name, limit=max_rows)
+if num_tests > len(due):
+    st.caption(f"First {len(due):,} tests shown")
+st.dataframe(
+    pd.DataFrame(due, columns=['Test Date', 'Subscription', 'Program', 'Test Frequency', 'Payment Plan', 'Price']),
+    hide_index=True,
+    use_container_width=True,
+    column_config={
+        'Test Date': st.column_config.DateColumn(format="YYYY-MM-DD"),
+        'Price': st.column_config.NumberColumn(format="$%.2f"),
+    }
+)
+
+st.subheader("Revenue by month")
+month = st.date_input("Month of", datetime.date.today())
+month_start = np.datetime64(month, 'M').astype('datetime64[D]')
+month_end = add_months(month_start, 1) - np.timedelta64(1, 'D')
+by_program = store.revenue_by_program(month_start, month_end)
+st.dataframe(
+    pd.DataFrame(
+        [(program, tests, amount) for program, (tests, amount) in by_program.items()],
+        columns=['Program', 'Tests', 'Revenue']
+    ),
+    hide_index=True,
+    use_container_width=True,
+    column_config={'Revenue': st.column_config.NumberColumn(format="$%.2f")}
+)
+total_tests = sum(tests for tests, _ in by_program.values())
+total_revenue = sum(amount for _, amount in by_program.values())
+st.markdown(
+    f"<h3 style='text-align: center; color: {colors['text']};'>💰 {month_start.item():%B %Y}: "
+    f"${total_revenue:,.2f} from {total_tests:,} tests</h3>",
+    unsafe_allow_html=True
+)
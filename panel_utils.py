@@ -0,0 +1,80 @@
+import numpy as np
+
+
+def rotation_columns(catalog):
+    """
+    Zero-copy numpy views of the catalog's panel rotation columns: (start, length) per plan, and the
+    panel and price of every rotation slot.
+    """
+    return (
+        np.frombuffer(catalog.rotation_start, dtype=np.int64),
+        np.frombuffer(catalog.rotation_length, dtype=np.int64),
+        np.frombuffer(catalog.rotation_panels, dtype=np.int64),
+        np.frombuffer(catalog.rotation_prices, dtype=np.float64),
+    )
+
+
+def test_panels(catalog, plan_index, test_number):
+    """
+    Returns (panel, price) of test `test_number` (counted from 0) of each plan `plan_index`. Panels index
+    `catalog.panel_names`, -1 for plans without a rotation, whose tests cost the plan's price per panel.
+    """
+    start, length, panels, prices = rotation_columns(catalog)
+    plan_index = np.asarray(plan_index, dtype=np.int64)
+    test_number = np.asarray(test_number, dtype=np.int64)
+    test_panel = np.full(plan_index.shape, -1, dtype=np.int64)
+    test_price = np.frombuffer(catalog.price_per_panel, dtype=np.float64)[plan_index]
+    # Only tests of rotating plans are looked up
+    rotating = np.flatnonzero(length[plan_index] > 0)
+    if len(rotating):
+        rotating_plans = plan_index[rotating]
+        slots = start[rotating_plans] + test_number[rotating] % length[rotating_plans]
+        test_panel[rotating] = panels[slots]
+        test_price[rotating] = prices[slots]
+    return test_panel, test_price
+
+
+def rotation_totals(catalog, plan_index, num_tests):
+    """
+    Cost of the first `num_tests` tests of each plan `plan_index`, in closed form: whole rotations
+    plus the first slots of the next one.
+    """
+    start, length, _, prices = rotation_columns(catalog)
+    prefix = np.concatenate([[0.0], np.cumsum(prices)])
+    plan_start = start[plan_index]
+    plan_length = length[plan_index]
+    full_cycles, rest = np.divmod(num_tests, np.maximum(plan_length, 1))
+    rotation_cost = (
+        full_cycles * (prefix[plan_start + plan_length] - prefix[plan_start])
+        + prefix[plan_start + rest] - prefix[plan_start]
+    )
+    plan_prices = np.frombuffer(catalog.price_per_panel, dtype=np.float64)[plan_index]
+    return np.where(plan_length > 0, rotation_cost, plan_prices * num_tests)
+
+
+def panel_demand(catalog, plan_index, num_tests):
+    """
+    Returns (tests, revenue) per panel of `catalog.panel_names` over subscriptions of plans `plan_index`
+    with `num_tests` tests each. Tests of plans without a rotation are left out.
+
+    Every slot of a rotation gets one test per whole rotation, and the first `num_tests % length`
+    slots one more, so no test is generated.
+    """
+    start, length, panels, prices = rotation_columns(catalog)
+    plan_index = np.asarray(plan_index, dtype=np.int64)
+    num_tests = np.broadcast_to(np.asarray(num_tests, dtype=np.int64), plan_index.shape)
+    rotating = length[plan_index] > 0
+    plan_index, num_tests = plan_index[rotating], num_tests[rotating]
+    full_cycles, rest = np.divmod(num_tests, length[plan_index])
+
+    slot_plan = np.repeat(np.arange(len(length)), length)
+    slot_tests = np.bincount(plan_index, weights=full_cycles, minlength=len(length))[slot_plan]
+    rest_rows = np.repeat(np.arange(len(rest)), rest)
+    rest_slots = start[plan_index][rest_rows] + np.arange(len(rest_rows)) - (np.cumsum(rest) - rest)[rest_rows]
+    slot_tests += np.bincount(rest_slots, minlength=len(panels))
+
+    num_panels = len(catalog.panel_names)
+    return (
+        np.bincount(panels, weights=slot_tests, minlength=num_panels).astype(np.int64),
+        np.bincount(panels, weights=slot_tests * prices, minlength=num_panels),
+    )
@@ -0,0 +1,40 @@
+"""
+Pricing and scheduling rules without any UI dependency.
+
+Only the standard library is imported here, so workers and scripts can use the schedule logic
+without paying for Streamlit, Plotly, pandas or numpy at startup.
+"""
+from pricing_core.catalog import (
+    CatalogWatcher,
+    PlanRecord,
+    PricingCatalog,
+    changed_plans,
+    default_watcher,
+    load_catalog,
+)
+from pricing_core.programs import PROGRAMS_PATH, load_programs
+from pricing_core.schedule import (
+    add_months,
+    calculate_schedule,
+    get_month_offset,
+    get_year_boundaries,
+    iter_test_dates,
+    schedule_test_dates,
+)
+
+__all__ = [
+    'CatalogWatcher',
+    'PROGRAMS_PATH',
+    'PlanRecord',
+    'PricingCatalog',
+    'add_months',
+    'calculate_schedule',
+    'changed_plans',
+    'default_watcher',
+    'get_month_offset',
+    'get_year_boundaries',
+    'iter_test_dates',
+    'load_catalog',
+    'load_programs',
+    'schedule_test_dates',
+]
@@ -0,0 +1,121 @@
+import bisect
+import calendar
+import datetime
+import functools
+import threading
+
+# Months precomputed for every start month; indexes grow past it on demand
+HORIZON_MONTHS = 120
+
+MONTH_LABELS = tuple(datetime.date(2000, month, 1).strftime('%b').upper() for month in range(1, 13))
+
+
+class CalendarIndex:
+    """
+    Month labels, year boundaries and day ordinals of a timeline starting in a given month.
+
+    Month i of the timeline is i months after the start month; a year boundary is the index of a
+    January, keyed by that January's year (same layout as get_year_boundaries). `month_starts[i]` is
+    the ordinal (date.toordinal()) of the first day of month i, so exact calendar arithmetic over the
+    timeline only takes integer lookups.
+    """
+
+    def __init__(self, year, month, horizon_months=HORIZON_MONTHS):
+        self.year = year
+        self.month = month
+        self.labels = []
+        self.boundary_months = []
+        self.boundary_years = []
+        # One more than the labels: the end of the last month is the start of the next one
+        self.month_starts = [datetime.date(year, month, 1).toordinal()]
+        self._lock = threading.Lock()
+        self.extend(horizon_months)
+
+    @property
+    def horizon_months(self):
+        return len(self.labels) - 1
+
+    def extend(self, horizon_months):
+        """
+        Appends the months up to `horizon_months`; months already indexed are kept as they are.
+        """
+        with self._lock:
+            for i in range(len(self.labels), horizon_months + 1):
+                month_index = self.month - 1 + i
+                # Boundaries and day ordinals first, so readers never see a label without them
+                if i > 0 and month_index % 12 == 0:
+                    self.boundary_years.append(self.year + month_index // 12)
+                    self.boundary_months.append(i)
+                self.month_starts.append(
+                    self.month_starts[-1] + calendar.monthrange(self.year + month_index // 12, month_index % 12 + 1)[1]
+                )
+                self.labels.append(MONTH_LABELS[month_index % 12])
+
+    def month_labels(self, duration_months):
+        """
+        Labels of months 0..duration_months.
+        """
+        if duration_months > self.horizon_months:
+            self.extend(max(duration_months, 2 * self.horizon_months))
+        return self.labels[:duration_months + 1]
+
+    def year_boundaries(self, duration_months):
+        """
+        {year: month index} of the year boundaries within months 1..duration_months.
+        """
+        if duration_months > self.horizon_months:
+            self.extend(max(duration_months, 2 * self.horizon_months))
+        end = bisect.bisect_right(self.boundary_months, duration_months)
+        return dict(zip(self.boundary_years[:end], self.boundary_months[:end]))
+
+    def shifted_start(self, start_day, months):
+        """
+        Ordinal of `add_months(start_date, months)` for a start date on day `start_day` of the start month.
+
+        Months before the start month are not indexed and are computed from the calendar instead.
+        """
+        if months < 0:
+            month_index = self.month - 1 + months
+            year, month = self.year + month_index // 12, month_index % 12 + 1
+            return datetime.date(year, month, min(start_day, calendar.monthrange(year, month)[1])).toordinal()
+        if months >= self.horizon_months:
+            self.extend(max(months + 1, 2 * self.horizon_months))
+        month_start = self.month_starts[months]
+        return month_start + min(start_day, self.month_starts[months + 1] - month_start) - 1
+
+    def month_offset(self, start_day, date):
+        """
+        Exact position of `date` on the timeline of a start date on day `start_day` of the start month.
+
+        Month m of the timeline runs from add_months(start_date, m) up to add_months(start_date, m + 1),
+        and a date sits at m plus the elapsed fraction of the days of its month. Month-based tests
+        land on whole months, whatever the lengths of the months in between.
+        """
+        months = (date.year - self.year) * 12 + date.month - self.month
+        ordinal = date.toordinal()
+        month_start = self.shifted_start(start_day, months)
+        if ordinal < month_start:
+            months -= 1
+            month_start = self.shifted_start(start_day, months)
+        month_end = self.shifted_start(start_day, months + 1)
+        return months + (ordinal - month_start) / (month_end - month_start)
+
+
+@functools.lru_cache(maxsize=None)
+def calendar_index(year, month):
+    """
+    Shared index for timelines starting in (year, month).
+    """
+    return CalendarIndex(year, month)
+
+
+def month_labels(start_date, duration_months):
+    return calendar_index(start_date.year, start_date.month).month_labels(duration_months)
+
+
+def year_boundaries(start_date, duration_months):
+    return calendar_index(start_date.year, start_date.month).year_boundaries(duration_months)
+
+
+def month_offset(start_date, date):
+    return calendar_index(start_date.year, start_date.month).month_offset(start_date.day, date)
@@ -0,0 +1,328 @@
+import bisect
+import functools
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from array import array
+
+from pricing_core.programs import PROGRAMS_PATH, load_programs
+
+PLAN_KEYS = {
+    'price_per_panel', 'period_months', 'period_weeks', 'duration_months', 'tests_included', 'test_details',
+    'panel_prices'
+}
+
+
+class PlanRecord:
+    """
+    One payment plan of the catalog. `duration_months` is None for pay-as-you-go plans.
+
+    `test_details` is the plan's panel rotation: test n gets panel `test_details[n % len(test_details)]`
+    (none if the plan has no rotation). `panel_prices` holds the price of each of these panels, the
+    plan's `price_per_panel` unless the programs table prices the panel on its own.
+    """
+
+    __slots__ = (
+        'index', 'program_name', 'test_frequency', 'payment_plan', 'price_per_panel',
+        'period_months', 'period_weeks', 'duration_months', 'tests_included', 'test_details', 'panel_prices',
+        'fingerprint'
+    )
+
+    def __init__(self, index, program_name, test_frequency, payment_plan, plan):
+        self.index = index
+        self.program_name = program_name
+        self.test_frequency = test_frequency
+        self.payment_plan = payment_plan
+        self.price_per_panel = plan['price_per_panel']
+        self.period_months = plan.get('period_months')
+        self.period_weeks = plan.get('period_weeks')
+        self.duration_months = plan.get('duration_months')
+        self.tests_included = plan.get('tests_included')
+        self.test_details = tuple(plan.get('test_details', ()))
+        custom_prices = plan.get('panel_prices', {})
+        self.panel_prices = tuple(custom_prices.get(detail, self.price_per_panel) for detail in self.test_details)
+        # Changes whenever the plan's key or any of its fields change
+        self.fingerprint = _digest([self.key, plan], sort_keys=True)
+
+    @property
+    def key(self):
+        return (self.program_name, self.test_frequency, self.payment_plan)
+
+    @property
+    def is_pay_as_you_go(self):
+        return self.duration_months is None
+
+    @property
+    def has_panel_rotation(self):
+        return bool(self.test_details)
+
+    def rotation(self, num_tests, first_test=0):
+        """
+        Returns (panels, prices) of tests `first_test` to `first_test + num_tests - 1`, as lists.
+        """
+        if not self.test_details:
+            return [""] * num_tests, [self.price_per_panel] * num_tests
+        cycle = len(self.test_details)
+        # Whole cycles are repeated rather than indexed one test at a time
+        shift = first_test % cycle
+        repeats = (shift + num_tests) // cycle + 1
+        end = shift + num_tests
+        return list(self.test_details * repeats)[shift:end], list(self.panel_prices * repeats)[shift:end]
+
+    def total_cost(self, num_tests):
+        """
+        Cost of the plan's first `num_tests` tests.
+        """
+        if not self.test_details:
+            return self.price_per_panel * num_tests
+        full_cycles, rest = divmod(num_tests, len(self.panel_prices))
+        return full_cycles * sum(self.panel_prices) + sum(self.panel_prices[:rest])
+
+    def __repr__(self):
+        return f"PlanRecord({self.program_name!r}, {self.test_frequency!r}, {self.payment_plan!r})"
+
+
+def _digest(value, sort_keys=False):
+    text = json.dumps(value, sort_keys=sort_keys, ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _is_count(value, minimum):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= minimum
+
+
+def _check_mapping(value, name):
+    if not isinstance(value, dict):
+        raise ValueError(f"{name}: expected an object, got {type(value).__name__}")
+
+
+def validate_plan(key, plan):
+    """
+    Raises ValueError if a plan entry of the `programs` table is malformed.
+    """
+    name = " / ".join(key)
+    if not isinstance(plan, dict):
+        raise ValueError(f"{name}: expected an object of plan fields")
+    unknown = set(plan) - PLAN_KEYS
+    if unknown:
+        raise ValueError(f"{name}: unknown keys {sorted(unknown)}")
+
+    price = plan.get('price_per_panel')
+    if isinstance(price, bool) or not isinstance(price, (int, float)) or not price > 0:
+        raise ValueError(f"{name}: 'price_per_panel' must be a positive number, got {price!r}")
+
+    if 'period_months' in plan and 'period_weeks' in plan:
+        raise ValueError(f"{name}: only one of 'period_months' and 'period_weeks' may be set")
+    if 'period_months' in plan and not _is_count(plan['period_months'], 0):
+        raise ValueError(f"{name}: 'period_months' must be a non-negative integer")
+    if 'period_weeks' in plan and not _is_count(plan['period_weeks'], 1):
+        raise ValueError(f"{name}: 'period_weeks' must be a positive integer")
+    if 'period_months' not in plan and 'period_weeks' not in plan:
+        raise ValueError(f"{name}: one of 'period_months' and 'period_weeks' is required")
+
+    for field in ('duration_months', 'tests_included'):
+        if field in plan and not _is_count(plan[field], 1):
+            raise ValueError(f"{name}: '{field}' must be a positive integer")
+
+    test_details = plan.get('test_details', [])
+    if not isinstance(test_details, (list, tuple)) or not all(isinstance(detail, str) for detail in test_details):
+        raise ValueError(f"{name}: 'test_details' must be a list of strings")
+
+    panel_prices = plan.get('panel_prices', {})
+    _check_mapping(panel_prices, f"{name}: 'panel_prices'")
+    for panel, panel_price in panel_prices.items():
+        if panel not in test_details:
+            raise ValueError(f"{name}: 'panel_prices' prices {panel!r}, which is not in 'test_details'")
+        if isinstance(panel_price, bool) or not isinstance(panel_price, (int, float)) or not panel_price > 0:
+            raise ValueError(f"{name}: the price of panel {panel!r} must be a positive number, got {panel_price!r}")
+
+
+class PricingCatalog:
+    """
+    Validated, flat view of the nested `programs` table.
+
+    Plans are indexed by (program, frequency, plan) and their numeric fields are also kept as
+    compact columns (`array`) so that batch code can read them without touching the records.
+    Missing periods and counts are stored as 0, missing durations as NaN.
+
+    Panel rotations are flattened the same way: `panel_names` lists every distinct panel, and the
+    rotation of plan i is slots `rotation_start[i]` to `rotation_start[i] + rotation_length[i] - 1`
+    of `rotation_panels` (index into `panel_names`) and `rotation_prices`.
+
+    A catalog is a snapshot: it is never modified after construction, a new price means a new
+    catalog with a new `version`.
+    """
+
+    def __init__(self, programs):
+        self.version = _digest(programs)
+        self.records = []
+        self._index = {}
+        self._frequencies = {}
+        self._payment_plans = {}
+
+        _check_mapping(programs, "programs")
+        for program_name, frequencies in programs.items():
+            _check_mapping(frequencies, program_name)
+            self._frequencies[program_name] = list(frequencies)
+            for test_frequency, payment_plans in frequencies.items():
+                _check_mapping(payment_plans, f"{program_name} / {test_frequency}")
+                self._payment_plans[(program_name, test_frequency)] = list(payment_plans)
+                for payment_plan, plan in payment_plans.items():
+                    key = (program_name, test_frequency, payment_plan)
+                    validate_plan(key, plan)
+                    record = PlanRecord(len(self.records), program_name, test_frequency, payment_plan, plan)
+                    self.records.append(record)
+                    self._index[key] = record
+
+        self.price_per_panel = array('d', (r.price_per_panel for r in self.records))
+        self.period_months = array('q', (r.period_months or 0 for r in self.records))
+        self.period_weeks = array('q', (r.period_weeks or 0 for r in self.records))
+        self.tests_included = array('q', (r.tests_included or 0 for r in self.records))
+        self.duration_months = array(
+            'd', (math.nan if r.duration_months is None else r.duration_months for r in self.records)
+        )
+
+        panel_ids = {}
+        self.rotation_start = array('q')
+        self.rotation_length = array('q')
+        self.rotation_panels = array('q')
+        self.rotation_prices = array('d')
+        for r in self.records:
+            self.rotation_start.append(len(self.rotation_panels))
+            self.rotation_length.append(len(r.test_details))
+            self.rotation_panels.extend(panel_ids.setdefault(detail, len(panel_ids)) for detail in r.test_details)
+            self.rotation_prices.extend(r.panel_prices)
+        self.panel_names = list(panel_ids)
+
+        # Record indices sorted by price, for price range queries
+        self._by_price = sorted(range(len(self.records)), key=self.price_per_panel.__getitem__)
+        self._sorted_prices = [self.price_per_panel[i] for i in self._by_price]
+
+        self.fingerprints = frozenset(r.fingerprint for r in self.records)
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_programs(path))
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get(self, program_name, test_frequency, payment_plan):
+        return self._index[(program_name, test_frequency, payment_plan)]
+
+    def program_names(self):
+        return list(self._frequencies)
+
+    def frequencies(self, program_name):
+        return self._frequencies[program_name]
+
+    def payment_plans(self, program_name, test_frequency):
+        return self._payment_plans[(program_name, test_frequency)]
+
+    def plans_under(self, max_price_per_panel):
+        """
+        Returns all plans whose price per panel is at most `max_price_per_panel`, cheapest first.
+        """
+        end = bisect.bisect_right(self._sorted_prices, max_price_per_panel)
+        return [self.records[i] for i in self._by_price[:end]]
+
+
+def changed_plans(old, new):
+    """
+    Returns the keys of the plans that were added, removed or modified between two catalogs.
+    """
+    old_fingerprints = {record.key: record.fingerprint for record in old}
+    new_fingerprints = {record.key: record.fingerprint for record in new}
+    return {
+        key for key in old_fingerprints.keys() | new_fingerprints.keys()
+        if old_fingerprints.get(key) != new_fingerprints.get(key)
+    }
+
+
+class CatalogWatcher:
+    """
+    Keeps the current catalog snapshot of a programs file and swaps in a new one when the file changes.
+
+    The file's modification time is checked at most every `check_interval` seconds. A file that
+    fails to load or validate is reported and ignored: the previous snapshot stays in use.
+    Listeners are called as `listener(old, new, changed_keys)` after every swap.
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.error = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stamp = self._file_stamp()
+        self._catalog = PricingCatalog.from_file(path)
+        self._checked_at = time.monotonic()
+
+    def _file_stamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def subscribe(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def current(self):
+        """
+        Returns the current snapshot, reloading the file first if it changed since the last check.
+        """
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.reload_if_changed()
+        return self._catalog
+
+    def reload_if_changed(self):
+        """
+        Reloads the file if its modification time or size changed. Returns True if a new snapshot was swapped in.
+        """
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                stamp = self._file_stamp()
+                if stamp == self._stamp:
+                    return False
+                catalog = PricingCatalog.from_file(self.path)
+            except (OSError, ValueError) as e:
+                # Keep serving the last good snapshot, e.g. while the file is half written
+                self.error = e
+                return False
+            self.error = None
+            self._stamp = stamp
+            if catalog.version == self._catalog.version:
+                return False
+            old, self._catalog = self._catalog, catalog
+            listeners = list(self._listeners)
+
+        changed_keys = changed_plans(old, catalog)
+        for listener in listeners:
+            listener(old, catalog, changed_keys)
+        return True
+
+
+@functools.lru_cache(maxsize=None)
+def default_watcher():
+    """
+    Watcher of the programs file (`PROGRAMS_PATH`), one per process.
+    """
+    return CatalogWatcher(PROGRAMS_PATH)
+
+
+def load_catalog():
+    """
+    Returns the current catalog snapshot of the programs file, picking up edits without a restart.
+
+    Callers that need consistent prices across several steps should call this once and keep the snapshot.
+    """
+    return default_watcher().current()
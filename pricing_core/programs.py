@@ -0,0 +1,16 @@
+import json
+import os
+
+# Pricing table, editable without touching the code. Running apps pick up changes on the fly
+PROGRAMS_PATH = os.environ.get(
+    'PROGRAMS_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'programs.json')
+)
+
+
+def load_programs(path=PROGRAMS_PATH):
+    """
+    Reads the nested `programs` table (program -> frequency -> plan -> fields) from a JSON file.
+    """
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,84 @@
+import calendar
+import datetime
+
+from pricing_core import calendar_index
+from pricing_core.catalog import load_catalog
+
+
+def add_months(date, months):
+    """
+    Same as `date + relativedelta(months=months)`: the day is clamped to the end of the target month.
+    """
+    month_index = date.month - 1 + months
+    year = date.year + month_index // 12
+    month = month_index % 12 + 1
+    return date.replace(year=year, month=month, day=min(date.day, calendar.monthrange(year, month)[1]))
+
+
+def iter_test_dates(plan, start_date, duration_months):
+    """
+    Yields the test dates of a catalog plan over `duration_months` months from `start_date`, in order.
+
+    Month-based tests fall on the start date and every `period_months` months after it, week-based
+    tests every `period_weeks` weeks after it. The counts are exact day counts, so every test falls
+    on or before the end date (`start_date` plus `duration_months` months).
+    """
+    if plan.period_months:
+        for i in range(duration_months // plan.period_months):
+            yield add_months(start_date, plan.period_months * i)
+    elif plan.period_weeks:
+        # Every whole period that fits before the end date, at most `tests_included`
+        end_date = add_months(start_date, duration_months)
+        num_tests = (end_date - start_date).days // (7 * plan.period_weeks)
+        if plan.tests_included:
+            num_tests = min(num_tests, plan.tests_included)
+        for i in range(1, num_tests + 1):
+            yield start_date + datetime.timedelta(weeks=plan.period_weeks * i)
+
+
+def schedule_test_dates(plan, start_date, duration_months):
+    """
+    Test dates of a catalog plan over `duration_months` months from `start_date`.
+    """
+    return list(iter_test_dates(plan, start_date, duration_months))
+
+
+def calculate_schedule(program_name, test_frequency, payment_plan, custom_duration=None, start_date=None,
+                       catalog=None):
+    """
+    Returns (test_dates, price_per_panel, all_months, duration_months, test_details) of a plan.
+
+    `test_details` holds the panel of each test for plans with a panel rotation, and is empty otherwise.
+    `start_date` defaults to today and `catalog` to the current one of the programs file.
+    """
+    if start_date is None:
+        start_date = datetime.date.today()
+    if catalog is None:
+        catalog = load_catalog()
+
+    plan = catalog.get(program_name, test_frequency, payment_plan)
+    duration_months = plan.duration_months
+    price_per_panel = plan.price_per_panel
+
+    if custom_duration is not None:
+        duration_months = custom_duration
+
+    test_dates = schedule_test_dates(plan, start_date, duration_months)
+    test_details = plan.rotation(len(test_dates))[0] if plan.has_panel_rotation else []
+    all_months = calendar_index.month_labels(start_date, duration_months)
+
+    return test_dates, price_per_panel, all_months, duration_months, test_details
+
+
+def get_month_offset(start_date, test_date):
+    """
+    Exact position of `test_date` on the timeline of `start_date`, in months (see CalendarIndex.month_offset).
+    """
+    return calendar_index.month_offset(start_date, test_date)
+
+
+def get_year_boundaries(start_date, duration_months):
+    """
+    Returns a dictionary with year numbers as keys and their corresponding month indices on the timeline.
+    """
+    return calendar_index.year_boundaries(start_date, duration_months)
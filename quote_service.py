@@ -0,0 +1,352 @@
+"""
+Headless HTTP/JSON quote service (ASGI) built on the same catalog and schedule rules as the apps.
+
+Usage:
+    uvicorn quote_service:app --port 8000
+    python quote_service.py --loadtest 5000 [--concurrency 200]
+
+Endpoints:
+    GET  /plans      every plan of the catalog
+    POST /schedule   {"program", "frequency", "plan", "start_date", "duration"?} -> test dates and total cost
+                     ("duration": 1 to 120 months, pay-as-you-go plans only)
+    POST /quote      same body -> number of tests and total cost, without the dates
+
+Concurrent /schedule and /quote requests are collected for a few milliseconds and priced together in
+one batch_schedule/batch_totals call on a process pool, so the event loop never runs the CPU work.
+Edits to the programs file are picked up without a restart: each batch is priced against the catalog
+snapshot its requests were validated against, which is sent to the workers along with the rows.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pricing_core import load_catalog
+from schedule_utils import batch_schedule, batch_totals
+from timeline_utils import MAX_DURATION_MONTHS
+
+
+class BadRequest(Exception):
+    pass
+
+
+def plan_listing(catalog):
+    return [
+        {
+            'program': plan.program_name,
+            'frequency': plan.test_frequency,
+            'plan': plan.payment_plan,
+            'price_per_panel': plan.price_per_panel,
+            'period_months': plan.period_months,
+            'period_weeks': plan.period_weeks,
+            'duration_months': plan.duration_months,
+            'tests_included': plan.tests_included,
+        }
+        for plan in catalog
+    ]
+
+
+def parse_quote_request(catalog, body):
+    """
+    Validates a /schedule or /quote body and returns it as a (start_date, program, frequency, plan, duration) row.
+    """
+    if not isinstance(body, dict):
+        raise BadRequest("Expected a JSON object")
+    try:
+        key = (body['program'], body['frequency'], body['plan'])
+    except KeyError as e:
+        raise BadRequest(f"Missing field {e.args[0]!r}")
+    if key not in catalog:
+        raise BadRequest(f"Unknown plan {' / '.join(map(str, key))}")
+
+    try:
+        start_date = datetime.date.fromisoformat(body.get('start_date') or datetime.date.today().isoformat())
+    except (TypeError, ValueError):
+        raise BadRequest("'start_date' must be an ISO date (YYYY-MM-DD)")
+
+    duration = body.get('duration')
+    is_pay_as_you_go = catalog.get(*key).is_pay_as_you_go
+    if duration is None and is_pay_as_you_go:
+        raise BadRequest("'duration' is required for pay-as-you-go plans")
+    if duration is not None and not is_pay_as_you_go:
+        raise BadRequest("'duration' is only accepted for pay-as-you-go plans")
+    if duration is not None and (
+        isinstance(duration, bool) or not isinstance(duration, int) or not 1 <= duration <= MAX_DURATION_MONTHS
+    ):
+        raise BadRequest(f"'duration' must be an integer from 1 to {MAX_DURATION_MONTHS}")
+
+    return (start_date.isoformat(),) + key + (duration,)
+
+
+def price_batch(kind, catalog, rows):
+    """
+    Prices rows validated against `catalog` in one vectorized call. Runs in the worker processes.
+
+    Should the batch fail, its rows are priced one at a time so that only the failing ones come back
+    as {'error': ...}.
+    """
+    try:
+        return _price_rows(kind, catalog, rows)
+    except Exception:
+        results = []
+        for row in rows:
+            try:
+                results.extend(_price_rows(kind, catalog, [row]))
+            except Exception as e:
+                results.append({'error': f"Pricing failed: {e}"})
+        return results
+
+
+def _price_rows(kind, catalog, rows):
+    start_dates, program_names, test_frequencies, payment_plans, durations = zip(*rows)
+    args = (catalog, start_dates, program_names, test_frequencies, payment_plans, durations)
+
+    if kind == 'quote':
+        totals = batch_totals(*args)
+        return [
+            {'num_tests': int(num_tests), 'total_cost': float(total_cost), 'duration_months': int(duration)}
+            for num_tests, total_cost, duration in zip(totals.num_tests, totals.total_cost, totals.duration_months)
+        ]
+
+    schedule = batch_schedule(*args)
+    date_strings = np.datetime_as_string(schedule.test_dates, unit='D').tolist()
+    ends = np.cumsum(schedule.num_tests).tolist()
+    starts = [0] + ends[:-1]
+    return [
+        {
+            'test_dates': date_strings[start:end],
+            'num_tests': end - start,
+            'price_per_panel': float(price),
+            'total_cost': float(total_cost),
+            'duration_months': int(duration),
+        }
+        for start, end, price, total_cost, duration in zip(
+            starts, ends, schedule.price_per_panel, schedule.total_cost, schedule.duration_months
+        )
+    ]
+
+
+class QuoteBatcher:
+    """
+    Collects concurrent requests and prices them in batches on an executor.
+
+    A batch is sent when `max_batch_size` requests are waiting or `max_wait` seconds after its first request.
+    """
+
+    def __init__(self, executor, max_batch_size=512, max_wait=0.002):
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self._pending = []
+        self._timer = None
+
+    async def submit(self, kind, catalog, row):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((kind, catalog, row, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        # One batch per kind and catalog snapshot: requests validated before and after a reload are
+        # not priced together
+        batches = {}
+        for kind, catalog, row, future in pending:
+            batches.setdefault((kind, catalog.version), (catalog, []))[1].append((row, future))
+        for (kind, _), (catalog, items) in batches.items():
+            asyncio.ensure_future(self._run(kind, catalog, items))
+
+    async def _run(self, kind, catalog, items):
+        self.batches += 1
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self.executor, price_batch, kind, catalog, [row for row, _ in items]
+            )
+        except Exception as e:
+            # The pool itself failed (e.g. a worker died): every request of the batch gets the error
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class QuoteService:
+    """
+    ASGI application. `workers=0` prices in a thread instead of a process pool (handy in tests).
+    """
+
+    def __init__(self, workers=None, max_batch_size=512, max_wait_ms=2):
+        self.workers = workers
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = None
+        self.batcher = None
+
+    def start(self):
+        if self.batcher is None:
+            self.executor = ProcessPoolExecutor(self.workers) if self.workers != 0 else None
+            self.batcher = QuoteBatcher(self.executor, self.max_batch_size, self.max_wait)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+        self.executor = None
+        self.batcher = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            status, payload = await self._handle(scope, receive)
+            body = json.dumps(payload).encode()
+            await send({
+                'type': 'http.response.start',
+                'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+            })
+            await send({'type': 'http.response.body', 'body': body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _handle(self, scope, receive):
+        path, method = scope['path'], scope['method']
+        if path == '/plans':
+            if method != 'GET':
+                return 405, {'error': "Method not allowed"}
+            return 200, plan_listing(load_catalog())
+        if path not in ('/schedule', '/quote'):
+            return 404, {'error': "Not found"}
+        if method != 'POST':
+            return 405, {'error': "Method not allowed"}
+
+        catalog = load_catalog()
+        try:
+            body = json.loads(await _read_body(receive) or b'null')
+            row = parse_quote_request(catalog, body)
+        except json.JSONDecodeError:
+            return 400, {'error': "Invalid JSON"}
+        except BadRequest as e:
+            return 400, {'error': str(e)}
+
+        self.start()
+        try:
+            result = await self.batcher.submit(path.lstrip('/'), catalog, row)
+        except Exception as e:
+            return 500, {'error': f"Pricing failed: {e}"}
+        if 'error' in result:
+            return 500, result
+        return 200, result
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def request(app, method, path, body=None):
+    """
+    Calls the ASGI app in-process. Returns (status, decoded JSON body).
+    """
+    messages = [{'type': 'http.request', 'body': json.dumps(body).encode() if body is not None else b''}]
+    response = {}
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        else:
+            response['body'] = message['body']
+
+    await app({'type': 'http', 'method': method, 'path': path, 'headers': []}, receive, send)
+    return response['status'], json.loads(response['body'])
+
+
+async def load_test(app, num_requests, concurrency):
+    """
+    Fires `num_requests` random /schedule and /quote requests, at most `concurrency` at a time.
+    Returns the sorted latencies in milliseconds.
+    """
+    plans = plan_listing(load_catalog())
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        plan = plans[i % len(plans)]
+        body = {
+            'program': plan['program'],
+            'frequency': plan['frequency'],
+            'plan': plan['plan'],
+            'start_date': (datetime.date(2025, 1, 1) + datetime.timedelta(days=i % 365)).isoformat(),
+            'duration': 12 if plan['duration_months'] is None else None,
+        }
+        async with semaphore:
+            start = time.perf_counter()
+            status, _ = await request(app, 'POST', '/schedule' if i % 2 else '/quote', body)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert status == 200
+
+    await asyncio.gather(*(one(i) for i in range(num_requests)))
+    return sorted(latencies)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quote service load test.")
+    parser.add_argument('--loadtest', type=int, default=2000, help="Number of requests to send")
+    parser.add_argument('--concurrency', type=int, default=200, help="Requests in flight at once")
+    parser.add_argument('--workers', type=int, default=None, help="Process pool size (0: no pool)")
+    args = parser.parse_args(argv)
+
+    service = QuoteService(workers=args.workers)
+    service.start()
+    try:
+        # Warm the pool up before measuring
+        asyncio.run(load_test(service, args.concurrency, args.concurrency))
+        start = time.perf_counter()
+        batches_before = service.batcher.batches
+        latencies = asyncio.run(load_test(service, args.loadtest, args.concurrency))
+        elapsed = time.perf_counter() - start
+        batches = service.batcher.batches - batches_before
+    finally:
+        service.shutdown()
+
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{len(latencies)} requests in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} req/s), "
+          f"p50 {statistics.median(latencies):.1f} ms, p99 {p99:.1f} ms, {batches} batches")
+
+
+app = QuoteService()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,399 @@
+"""
+Recomputes the quotes and revenue projection of stored subscriptions after a catalog change, on every core.
+
+Usage:
+    python repricing.py [--db subscriptions.db] [--workers N] [--all] [--dry-run] [--output quotes.csv]
+    python repricing.py --benchmark [--subscriptions 200000] [--max-workers N]
+
+By default only the subscriptions made on an older version of their plan (see
+SubscriptionStore.plan_subscriptions) are repriced; --all reprices every subscription. Subscriptions
+are partitioned by (program, frequency, plan) and large partitions are split into chunks, so every
+task is a single batch_schedule call. The subscription arrays and the results live in shared memory:
+workers read their slice and write the number of tests, the total cost and a revenue row per month
+in place, and only a few integers go through pickling.
+
+Every finished chunk is also checkpointed to disk, under the catalog version, by the worker that
+computed it, with the new test dates and prices of its subscriptions. A run that is interrupted for
+any reason picks up from the chunks already saved. Unless --dry-run is given, the parent writes each
+chunk back to the store, in one transaction per chunk, as soon as it is checkpointed. Checkpoints are
+named after the first subscription of their chunk rather than its position, so they still match when
+the chunks written back before the interruption drop out of the next changed-only run.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from pricing_core import load_catalog
+from schedule_utils import batch_schedule
+from subscription_store import STORE_PATH, SubscriptionStore
+
+CHECKPOINT_DIR = os.environ.get(
+    'REPRICING_CHECKPOINT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'repricing_checkpoints')
+)
+
+# Subscriptions per task: big enough to amortize a batch_schedule call, small enough to balance cores
+CHUNK_SIZE = 50_000
+
+RepricingResult = namedtuple(
+    'RepricingResult',
+    [
+        'plan_keys',          # (program, frequency, plan) of each repriced plan
+        'plan_row',           # Plan (index into plan_keys) of each subscription
+        'subscription_ids',   # Subscription ids, grouped by plan
+        'num_tests',          # Tests per subscription under the new catalog
+        'total_cost',         # Total cost per subscription under the new catalog
+        'month_starts',       # datetime64[D] first day of each projected calendar month
+        'revenue_per_month',  # Revenue, shape (plans, months)
+        'updated',            # Subscriptions whose new tests were written back to the store
+    ]
+)
+
+
+class SharedArrays:
+    """
+    Named numpy arrays in shared memory. The creating process owns (and finally unlinks) the blocks;
+    worker processes, which share its resource tracker, attach to them from `spec`.
+    """
+
+    def __init__(self, spec, create=False):
+        self.spec = spec
+        self._blocks = []
+        self.arrays = {}
+        for name, (dtype, shape, block_name) in spec.items():
+            size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            block = shared_memory.SharedMemory(name=block_name, create=create, size=size if create else 0)
+            self._blocks.append(block)
+            self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    @classmethod
+    def create(cls, shapes):
+        """
+        Allocates zeroed arrays; `shapes` maps each name to (dtype, shape).
+        """
+        spec = {
+            name: (np.dtype(dtype).str, tuple(shape), f'reprice_{os.getpid()}_{id(shapes)}_{name}')
+            for name, (dtype, shape) in shapes.items()
+        }
+        shared = cls(spec, create=True)
+        for array in shared.arrays.values():
+            array[...] = 0
+        return shared
+
+    def close(self, unlink=False):
+        self.arrays = {}
+        for block in self._blocks:
+            block.close()
+            if unlink:
+                block.unlink()
+        self._blocks = []
+
+
+# State of a worker process, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(catalog, spec, checkpoint_dir, first_month):
+    _worker.update(
+        catalog=catalog, shared=SharedArrays(spec), checkpoint_dir=checkpoint_dir, first_month=first_month
+    )
+
+
+def _checkpoint_path(checkpoint_dir, plan, first_row):
+    return os.path.join(checkpoint_dir, f'{plan.fingerprint}-{first_row}.npz')
+
+
+def _reprice_chunk(plan_key, chunk, start, stop):
+    """
+    Reprices subscriptions [start, stop) of the shared arrays, all on plan `plan_key`, and checkpoints them.
+    """
+    catalog = _worker['catalog']
+    arrays = _worker['shared'].arrays
+    num_months = arrays['revenue'].shape[1]
+    count = stop - start
+
+    schedule = batch_schedule(
+        catalog,
+        arrays['start_days'][start:stop].astype('datetime64[D]'),
+        [plan_key[0]] * count,
+        [plan_key[1]] * count,
+        [plan_key[2]] * count,
+        arrays['durations'][start:stop]
+    )
+    arrays['num_tests'][start:stop] = schedule.num_tests
+    arrays['total_cost'][start:stop] = schedule.total_cost
+    test_months = schedule.test_dates.astype('datetime64[M]').astype(np.int64) - _worker['first_month']
+    arrays['revenue'][chunk] = np.bincount(test_months, weights=schedule.test_prices, minlength=num_months)
+    test_days = schedule.test_dates.astype(np.int64)
+
+    # Written aside and renamed, so a checkpoint is either complete or missing
+    path = _checkpoint_path(_worker['checkpoint_dir'], catalog.get(*plan_key), int(arrays['rows'][start]))
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(
+                f,
+                rows=arrays['rows'][start:stop],
+                start_days=arrays['start_days'][start:stop],
+                durations=arrays['durations'][start:stop],
+                num_tests=arrays['num_tests'][start:stop],
+                total_cost=arrays['total_cost'][start:stop],
+                test_days=test_days,
+                test_prices=schedule.test_prices,
+            )
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return count
+
+
+def _load_checkpoint(path, arrays, chunk, start, stop, first_month):
+    """
+    Copies a saved chunk into the shared arrays. Returns False if there is none or it no longer
+    matches the subscriptions (the store changed since it was saved).
+
+    The revenue row is rebuilt from the saved tests, as the projection may start at another month
+    than in the interrupted run.
+    """
+    num_months = arrays['revenue'].shape[1]
+    try:
+        with np.load(path) as saved:
+            if 'test_days' not in saved.files or not all(
+                np.array_equal(saved[name], arrays[name][start:stop]) for name in ('rows', 'start_days', 'durations')
+            ):
+                return False
+            arrays['num_tests'][start:stop] = saved['num_tests']
+            arrays['total_cost'][start:stop] = saved['total_cost']
+            test_months = saved['test_days'].astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+            arrays['revenue'][chunk] = np.bincount(
+                test_months - first_month, weights=saved['test_prices'], minlength=num_months
+            )
+    except (OSError, ValueError, KeyError):
+        return False
+    return True
+
+
+def _persist_chunk(store, plan, path, arrays, start, stop):
+    """
+    Writes the new tests of a checkpointed chunk back to the store. Returns the number of subscriptions updated.
+    """
+    with np.load(path) as saved:
+        test_days, test_prices = saved['test_days'], saved['test_prices']
+    return store.replace_schedules(
+        plan,
+        arrays['rows'][start:stop],
+        arrays['start_days'][start:stop],
+        arrays['durations'][start:stop],
+        arrays['num_tests'][start:stop],
+        test_days,
+        test_prices,
+    )
+
+
+def reprice(store, catalog, workers=None, changed_only=True, chunk_size=CHUNK_SIZE, checkpoint_dir=CHECKPOINT_DIR,
+            persist=True):
+    """
+    Reprices the stored subscriptions under `catalog` and returns a RepricingResult.
+
+    `workers=0` computes in this process instead of a process pool (handy in tests). Chunks already
+    checkpointed for this catalog version are loaded rather than computed again. With `persist`, every
+    chunk is written back to the store (see SubscriptionStore.replace_schedules) once it is checkpointed.
+    """
+    keys, counts, subscription_ids, rows, start_days, durations = store.plan_subscriptions(catalog, changed_only)
+    plan_row = np.repeat(np.arange(len(keys)), counts)
+    # The store keeps the duration each subscription was quoted for: it stands for pay-as-you-go
+    # plans, the others run for their plan's (possibly new) duration
+    plans = [catalog.get(*key) for key in keys]
+    plan_durations = np.array([
+        -1 if plan.is_pay_as_you_go else plan.duration_months for plan in plans
+    ], dtype=np.int64)[plan_row]
+    durations = np.where(plan_durations < 0, durations, plan_durations)
+
+    # Calendar months from the earliest start to the latest possible test
+    start_months = start_days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    first_month = int(start_months.min(initial=0))
+    num_months = int((start_months + durations).max(initial=first_month)) - first_month + 1
+
+    # Chunks never mix plans
+    tasks = []
+    plan_starts = np.cumsum(counts) - counts
+    for key, plan_start, count in zip(keys, plan_starts.tolist(), counts.tolist()):
+        for offset in range(0, count, chunk_size):
+            tasks.append((key, len(tasks), plan_start + offset, plan_start + min(offset + chunk_size, count)))
+
+    checkpoint_dir = os.path.join(checkpoint_dir, catalog.version, 'changed' if changed_only else 'all')
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    shared = SharedArrays.create({
+        'rows': (np.int64, (len(rows),)),
+        'start_days': (np.int64, (len(rows),)),
+        'durations': (np.int64, (len(rows),)),
+        'num_tests': (np.int64, (len(rows),)),
+        'total_cost': (np.float64, (len(rows),)),
+        'revenue': (np.float64, (len(tasks), num_months)),
+    })
+    try:
+        arrays = shared.arrays
+        arrays['rows'][:] = rows
+        arrays['start_days'][:] = start_days
+        arrays['durations'][:] = durations
+
+        updated = 0
+
+        def checkpoint_path(task):
+            return _checkpoint_path(checkpoint_dir, catalog.get(*task[0]), int(rows[task[2]]))
+
+        def done(task):
+            nonlocal updated
+            if persist:
+                updated += _persist_chunk(store, catalog.get(*task[0]), checkpoint_path(task), arrays, *task[2:])
+
+        pending = []
+        for task in tasks:
+            if _load_checkpoint(checkpoint_path(task), arrays, *task[1:], first_month):
+                done(task)
+            else:
+                pending.append(task)
+        initargs = (catalog, shared.spec, checkpoint_dir, first_month)
+        if workers == 0:
+            _init_worker(*initargs)
+            try:
+                for task in pending:
+                    _reprice_chunk(*task)
+                    done(task)
+            finally:
+                _worker.pop('shared').close()
+        elif pending:
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as executor:
+                futures = {executor.submit(_reprice_chunk, *task): task for task in pending}
+                try:
+                    for future in as_completed(futures):
+                        future.result()
+                        done(futures[future])
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+        task_plans = np.array([keys.index(task[0]) for task in tasks], dtype=np.int64)
+        revenue_per_month = np.zeros((len(keys), num_months))
+        np.add.at(revenue_per_month, task_plans, arrays['revenue'])
+        result = RepricingResult(
+            plan_keys=keys,
+            plan_row=plan_row,
+            subscription_ids=subscription_ids,
+            num_tests=arrays['num_tests'].copy(),
+            total_cost=arrays['total_cost'].copy(),
+            month_starts=(np.datetime64(first_month, 'M') + np.arange(num_months)).astype('datetime64[D]'),
+            revenue_per_month=revenue_per_month,
+            updated=updated,
+        )
+    finally:
+        shared.close(unlink=True)
+    return result
+
+
+def synthetic_store(path, catalog, num_subscriptions, seed=0):
+    """
+    Fills a store with random subscriptions of every plan of `catalog`, starting over two years.
+    """
+    store = SubscriptionStore(path)
+    rng = np.random.default_rng(seed)
+    plans = list(catalog)
+    for offset in range(0, num_subscriptions, 100_000):
+        count = min(100_000, num_subscriptions - offset)
+        picked = rng.integers(len(plans), size=count)
+        store.add_many(
+            catalog,
+            [f'synthetic-{offset + i}' for i in range(count)],
+            np.datetime64('2024-01-01') + rng.integers(730, size=count).astype('timedelta64[D]'),
+            [plans[i].program_name for i in picked],
+            [plans[i].test_frequency for i in picked],
+            [plans[i].payment_plan for i in picked],
+            np.where([plans[i].is_pay_as_you_go for i in picked], rng.integers(1, 121, size=count), np.nan)
+        )
+    return store
+
+
+def benchmark(num_subscriptions, max_workers):
+    """
+    Prints the wall time of a full repricing with 1 to `max_workers` workers.
+    """
+    catalog = load_catalog()
+    directory = tempfile.mkdtemp(prefix='repricing_benchmark_')
+    try:
+        start = time.perf_counter()
+        store = synthetic_store(os.path.join(directory, 'subscriptions.db'), catalog, num_subscriptions)
+        print(f"{num_subscriptions} synthetic subscriptions stored in {time.perf_counter() - start:.1f}s "
+              f"({os.cpu_count()} CPUs)")
+        baseline = None
+        for workers in range(1, max_workers + 1):
+            # A fresh checkpoint directory per run, so nothing is resumed
+            checkpoint_dir = tempfile.mkdtemp(dir=directory)
+            start = time.perf_counter()
+            result = reprice(store, catalog, workers, changed_only=False, checkpoint_dir=checkpoint_dir, persist=False)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{workers:3d} workers {elapsed:8.2f}s  speedup {baseline / elapsed:5.2f}  "
+                  f"efficiency {baseline / elapsed / workers:6.1%}  ({len(result.num_tests)} subscriptions)")
+        store.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reprice stored subscriptions under the current catalog.")
+    parser.add_argument('--db', default=STORE_PATH, help="SQLite subscription store")
+    parser.add_argument('--workers', type=int, default=None, help="Process pool size (0: no pool)")
+    parser.add_argument('--all', action='store_true', help="Reprice every subscription, not only changed plans")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Subscriptions per task")
+    parser.add_argument('--checkpoint-dir', default=CHECKPOINT_DIR, help="Where finished chunks are saved")
+    parser.add_argument('--dry-run', action='store_true', help="Compute the new quotes without updating the store")
+    parser.add_argument('--output', help="Write the new quotes to this CSV or Parquet file")
+    parser.add_argument('--benchmark', action='store_true', help="Print the scaling curve on synthetic data")
+    parser.add_argument('--subscriptions', type=int, default=200_000, help="Benchmark size")
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count(), help="Benchmark up to this many workers")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        benchmark(args.subscriptions, args.max_workers)
+        return
+
+    store = SubscriptionStore(args.db)
+    start = time.perf_counter()
+    result = reprice(
+        store, load_catalog(), args.workers, not args.all, args.chunk_size, args.checkpoint_dir, not args.dry_run
+    )
+    print(f"Repriced {len(result.num_tests)} subscriptions of {len(result.plan_keys)} plans "
+          f"in {time.perf_counter() - start:.1f}s, ${result.total_cost.sum():,.2f} in total, "
+          f"{result.updated} updated in the store")
+    for key, revenue in zip(result.plan_keys, result.revenue_per_month):
+        print(f"  {' / '.join(key)}: ${revenue.sum():,.2f}")
+
+    if args.output:
+        quotes = pd.DataFrame({
+            'subscription_id': result.subscription_ids,
+            'program': [result.plan_keys[row][0] for row in result.plan_row],
+            'frequency': [result.plan_keys[row][1] for row in result.plan_row],
+            'plan': [result.plan_keys[row][2] for row in result.plan_row],
+            'num_tests': result.num_tests,
+            'total_cost': result.total_cost,
+        })
+        if args.output.lower().endswith(('.parquet', '.pq')):
+            quotes.to_parquet(args.output, index=False)
+        else:
+            quotes.to_csv(args.output, index=False)
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
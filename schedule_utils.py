@@ -0,0 +1,297 @@
+from collections import namedtuple
+
+import numpy as np
+
+from panel_utils import panel_demand, rotation_totals, test_panels
+
+BatchSchedule = namedtuple(
+    'BatchSchedule',
+    [
+        'test_row',         # Input row each test belongs to
+        'test_dates',       # datetime64[D] test dates, grouped by row
+        'test_prices',      # Price of each test
+        'test_panel',       # Panel of each test (index into catalog.panel_names), -1 without a rotation
+        'num_tests',        # Number of tests per input row
+        'total_cost',       # Sum of the test prices per input row
+        'price_per_panel',  # Price per panel per input row
+        'duration_months',  # Effective duration per input row
+    ]
+)
+
+BatchTotals = namedtuple(
+    'BatchTotals',
+    [
+        'num_tests',        # Number of tests per input row
+        'total_cost',       # Cost of these tests per input row (price_per_panel * num_tests without panel prices)
+        'price_per_panel',  # Price per panel per input row
+        'duration_months',  # Effective duration per input row
+    ]
+)
+
+
+# Day-ordinal tables over 1900-2399: the day number (days since 1970-01-01) of the first day of every
+# month, and the month (index into _MONTH_STARTS) of every day, so calendar arithmetic on millions of
+# dates is a few integer lookups
+_MONTH_STARTS = np.arange('1900-01', '2400-02', dtype='datetime64[M]').astype('datetime64[D]').astype(np.int64)
+_DAY_MONTHS = np.repeat(np.arange(len(_MONTH_STARTS) - 1, dtype=np.int32), np.diff(_MONTH_STARTS))
+
+
+def add_months(dates, months):
+    """
+    Vectorized `date + relativedelta(months=n)`: the day is clamped to the end of the target month.
+    """
+    days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    day_index = days - _MONTH_STARTS[0]
+    if day_index.size and (day_index.min() < 0 or day_index.max() >= len(_DAY_MONTHS)):
+        return _add_months_outside_tables(days.astype('datetime64[D]'), months)
+    month = _DAY_MONTHS[day_index]
+    target = month + months
+    if target.size and (target.min() < 0 or target.max() >= len(_MONTH_STARTS) - 1):
+        return _add_months_outside_tables(days.astype('datetime64[D]'), months)
+    target_start = _MONTH_STARTS[target]
+    day = days - _MONTH_STARTS[month]
+    return (target_start + np.minimum(day, _MONTH_STARTS[target + 1] - target_start - 1)).astype('datetime64[D]')
+
+
+def _add_months_outside_tables(dates, months):
+    month_start = dates.astype('datetime64[M]')
+    day = dates - month_start.astype('datetime64[D]')
+    target = month_start + months
+    target_start = target.astype('datetime64[D]')
+    last_day = (target + 1).astype('datetime64[D]') - target_start - np.timedelta64(1, 'D')
+    return target_start + np.minimum(day, last_day)
+
+
+def month_offsets(start_dates, test_dates):
+    """
+    Vectorized pricing_core.get_month_offset: exact position of each test date on the timeline of its
+    start date, in months.
+    """
+    start_dates = np.asarray(start_dates, dtype='datetime64[D]')
+    test_dates = np.asarray(test_dates, dtype='datetime64[D]')
+    months = (test_dates.astype('datetime64[M]') - start_dates.astype('datetime64[M]')).astype(np.int64)
+    # Calendar months apart, minus one when the day of the month is not reached yet
+    months -= test_dates < add_months(start_dates, months)
+    month_start = add_months(start_dates, months)
+    month_days = (add_months(start_dates, months + 1) - month_start).astype(np.int64)
+    return months + (test_dates - month_start).astype(np.int64) / month_days
+
+
+def _schedule_counts(start_dates, period_months, period_weeks, tests_included, duration_months):
+    """
+    Exact number of tests per row: whole month periods within the duration, or whole week periods
+    between the start and end dates (at most `tests_included`).
+    """
+    is_months = period_months > 0
+    is_weeks = ~is_months & (period_weeks > 0)
+
+    days = (add_months(start_dates, duration_months) - start_dates).astype(np.int64)
+    weeks_fitting = days // (7 * np.maximum(period_weeks, 1))
+    num_tests = np.where(
+        is_months,
+        duration_months // np.maximum(period_months, 1),
+        np.where(is_weeks, np.where(tests_included > 0, np.minimum(tests_included, weeks_fitting), weeks_fitting), 0)
+    )
+    return is_months, is_weeks, np.maximum(num_tests, 0)
+
+
+def _count_tests(start_dates, period_months, period_weeks, tests_included, duration_months):
+    """
+    Closed-form number of tests per row, equal to the length of the date list _expand builds.
+    """
+    return _schedule_counts(start_dates, period_months, period_weeks, tests_included, duration_months)[2]
+
+
+def _expand(start_dates, period_months, period_weeks, tests_included, duration_months):
+    """
+    Expands per-row plan parameters into (row, test date) pairs following the rules of pricing_core.calculate_schedule.
+    """
+    is_months, is_weeks, num_tests = _schedule_counts(
+        start_dates, period_months, period_weeks, tests_included, duration_months
+    )
+
+    rows = np.repeat(np.arange(len(start_dates)), num_tests)
+    first = np.cumsum(num_tests) - num_tests
+    # Month-based tests start at the start date, week-based tests one period later
+    step = np.arange(len(rows)) - first[rows] + is_weeks[rows]
+
+    row_start = start_dates[rows]
+    month_dates = add_months(row_start, period_months[rows] * step)
+    week_dates = row_start + (7 * period_weeks[rows] * step).astype('timedelta64[D]')
+    return rows, np.where(is_months[rows], month_dates, week_dates)
+
+
+def _catalog_columns(catalog):
+    """
+    Zero-copy numpy views of the catalog's plan columns.
+    """
+    return (
+        np.frombuffer(catalog.period_months, dtype=np.int64),
+        np.frombuffer(catalog.period_weeks, dtype=np.int64),
+        np.frombuffer(catalog.tests_included, dtype=np.int64),
+        np.frombuffer(catalog.price_per_panel, dtype=np.float64),
+        np.frombuffer(catalog.duration_months, dtype=np.float64),
+    )
+
+
+def _apply_durations(duration_months, durations):
+    """
+    Overrides plan durations with custom ones where given (None/NaN keeps the plan's duration).
+    """
+    if durations is not None:
+        durations = np.broadcast_to(np.asarray(durations, dtype=np.float64), duration_months.shape)
+        duration_months = np.where(np.isnan(durations), duration_months, durations)
+    if np.isnan(duration_months).any():
+        raise ValueError("A duration is required for plans without 'duration_months' (e.g. 'Pay as you go')")
+    return duration_months.astype(np.int64)
+
+
+def _lookup_plans(catalog, program_names, test_frequencies, payment_plans):
+    """
+    Resolves each (program, frequency, plan) row to its catalog record index, looking every distinct combination up once.
+    """
+    keys = np.char.add(
+        np.char.add(np.asarray(program_names, dtype=str), '\x1f'),
+        np.char.add(np.char.add(np.asarray(test_frequencies, dtype=str), '\x1f'), np.asarray(payment_plans, dtype=str))
+    )
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    unique_indices = np.array(
+        [catalog.get(*key.split('\x1f')).index for key in unique_keys],
+        dtype=np.int64
+    )
+    return unique_indices[inverse]
+
+
+def batch_schedule(catalog, start_dates, program_names, test_frequencies, payment_plans, durations=None):
+    """
+    Computes the test dates and prices of many customers in one pass.
+
+    All arguments after `catalog` are equal-length sequences, one entry per customer. A duration of
+    None/NaN keeps the plan's own 'duration_months', like `custom_duration=None` in calculate_schedule.
+    """
+    start_dates = np.asarray(start_dates, dtype='datetime64[D]')
+    plan_index = _lookup_plans(catalog, program_names, test_frequencies, payment_plans)
+    period_months, period_weeks, tests_included, price_per_panel, plan_durations = _catalog_columns(catalog)
+    duration_months = _apply_durations(plan_durations[plan_index], durations)
+
+    rows, dates = _expand(
+        start_dates,
+        period_months[plan_index],
+        period_weeks[plan_index],
+        tests_included[plan_index],
+        duration_months
+    )
+    num_tests = np.bincount(rows, minlength=len(start_dates))
+    # Tests are grouped by row, so a test's number within its row follows from the row offsets
+    test_number = np.arange(len(rows)) - (np.cumsum(num_tests) - num_tests)[rows]
+    test_panel, test_prices = test_panels(catalog, plan_index[rows], test_number)
+    return BatchSchedule(
+        test_row=rows,
+        test_dates=dates,
+        test_prices=test_prices,
+        test_panel=test_panel,
+        num_tests=num_tests,
+        total_cost=np.bincount(rows, weights=test_prices, minlength=len(start_dates)),
+        price_per_panel=price_per_panel[plan_index],
+        duration_months=duration_months,
+    )
+
+
+def batch_totals(catalog, start_dates, program_names, test_frequencies, payment_plans, durations=None):
+    """
+    Same arguments as batch_schedule, but only returns the number of tests and total cost per row.
+
+    The counts are computed in closed form, without generating any test date.
+    """
+    start_dates = np.asarray(start_dates, dtype='datetime64[D]')
+    plan_index = _lookup_plans(catalog, program_names, test_frequencies, payment_plans)
+    period_months, period_weeks, tests_included, price_per_panel, plan_durations = _catalog_columns(catalog)
+    duration_months = _apply_durations(plan_durations[plan_index], durations)
+
+    num_tests = _count_tests(
+        start_dates,
+        period_months[plan_index],
+        period_weeks[plan_index],
+        tests_included[plan_index],
+        duration_months
+    )
+    return BatchTotals(
+        num_tests=num_tests,
+        total_cost=rotation_totals(catalog, plan_index, num_tests),
+        price_per_panel=price_per_panel[plan_index],
+        duration_months=duration_months,
+    )
+
+
+def batch_panel_demand(catalog, start_dates, program_names, test_frequencies, payment_plans, durations=None):
+    """
+    Same arguments as batch_schedule, but only returns (tests, revenue) per panel of `catalog.panel_names`
+    over all rows. Tests of plans without a panel rotation are left out.
+
+    Like batch_totals, nothing is scheduled: the counts and each plan's rotation are enough.
+    """
+    start_dates = np.asarray(start_dates, dtype='datetime64[D]')
+    plan_index = _lookup_plans(catalog, program_names, test_frequencies, payment_plans)
+    period_months, period_weeks, tests_included, _, plan_durations = _catalog_columns(catalog)
+    duration_months = _apply_durations(plan_durations[plan_index], durations)
+
+    num_tests = _count_tests(
+        start_dates,
+        period_months[plan_index],
+        period_weeks[plan_index],
+        tests_included[plan_index],
+        duration_months
+    )
+    return panel_demand(catalog, plan_index, num_tests)
+
+
+def _plan_arrays(plan, start_date, duration_months):
+    """
+    One-row parameter arrays for a single catalog plan, in the argument order of _expand.
+    """
+    plan_duration = np.nan if plan.duration_months is None else plan.duration_months
+    return (
+        np.array([start_date], dtype='datetime64[D]'),
+        np.array([plan.period_months or 0]),
+        np.array([plan.period_weeks or 0]),
+        np.array([plan.tests_included or 0]),
+        _apply_durations(np.array([plan_duration], dtype=np.float64), [duration_months])
+    )
+
+
+def plan_test_dates(plan, start_date, duration_months):
+    """
+    Returns the test dates of a single catalog plan as a list of datetime.date objects.
+    """
+    _, dates = _expand(*_plan_arrays(plan, start_date, duration_months))
+    return dates.tolist()
+
+
+def plan_quote(plan, start_date, duration_months):
+    """
+    Returns (number of tests, total cost) of a single catalog plan without generating its dates.
+    """
+    num_tests = int(_count_tests(*_plan_arrays(plan, start_date, duration_months))[0])
+    return num_tests, plan.total_cost(num_tests)
+
+
+def plan_cash_flow(plan, start_date, duration_months):
+    """
+    Amount paid per calendar month of a single catalog plan, indexed by months since the start month.
+
+    Payments are made per test, so a month's amount is the sum of the prices of its tests.
+    """
+    start, period_months, period_weeks, tests_included, durations = _plan_arrays(plan, start_date, duration_months)
+    num_tests = int(_count_tests(start, period_months, period_weeks, tests_included, durations)[0])
+    test_prices = plan.rotation(num_tests)[1]
+    cash_flow = np.zeros(int(durations[0]) + 1)
+    if period_months[0] > 0:
+        # Month-based tests fall every `period_months` calendar months from the start month
+        cash_flow[:num_tests * period_months[0]:period_months[0]] = test_prices
+    elif num_tests:
+        days = np.arange(1, num_tests + 1) * 7 * period_weeks[0]
+        test_months = (start[0] + days.astype('timedelta64[D]')).astype('datetime64[M]')
+        month_offsets = (test_months - start[0].astype('datetime64[M]')).astype(np.int64)
+        cash_flow += np.bincount(month_offsets, weights=test_prices, minlength=len(cash_flow))
+    return cash_flow
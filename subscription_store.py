@@ -0,0 +1,383 @@
+"""
+Customer subscriptions and their materialized test dates, stored in a local SQLite database.
+
+Usage:
+    python subscription_store.py customers.csv [--db subscriptions.db] [--chunksize 100000]
+
+Loads a file in the input format of bulk_quote.py (CSV or Parquet) into the store. Test dates and
+prices are computed once, when a subscription is added, and kept as they were when the catalog
+changes, until repricing.py writes the new ones back (see replace_schedules). Tests are clustered by
+subscription and indexed by (date, program) and (program, date) with their price, so range queries
+such as the tests due next week, the revenue of a month or the tests per day of a window are
+answered from the indexes alone. Dates are stored as day numbers (days since 1970-01-01).
+"""
+import argparse
+import functools
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from schedule_utils import batch_schedule
+
+STORE_PATH = os.environ.get(
+    'SUBSCRIPTION_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'subscriptions.db')
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS programs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id INTEGER PRIMARY KEY,
+    subscription_id TEXT NOT NULL UNIQUE,
+    program INTEGER NOT NULL REFERENCES programs(id),
+    frequency TEXT NOT NULL,
+    plan TEXT NOT NULL,
+    start_day INTEGER NOT NULL,
+    duration_months INTEGER NOT NULL,
+    price_per_panel REAL NOT NULL,
+    plan_fingerprint TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS subscriptions_by_plan ON subscriptions(program, frequency, plan);
+CREATE TABLE IF NOT EXISTS tests (
+    subscription INTEGER NOT NULL REFERENCES subscriptions(id) ON DELETE CASCADE,
+    test_day INTEGER NOT NULL,
+    program INTEGER NOT NULL,
+    price REAL NOT NULL,
+    PRIMARY KEY (subscription, test_day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tests_by_day ON tests(test_day, program, price);
+CREATE INDEX IF NOT EXISTS tests_by_program ON tests(program, test_day, price);
+"""
+
+# Page cache of the connection (negative: KiB), so bulk inserts don't thrash the indexes
+CACHE_KIB = 256 * 1024
+
+DueTest = namedtuple('DueTest', ['test_date', 'subscription_id', 'program', 'frequency', 'plan', 'price'])
+
+
+def _day(date):
+    return int(np.datetime64(date, 'D').astype(np.int64))
+
+
+class SubscriptionStore:
+    """
+    SQLite store of subscriptions. One connection is opened per store and shared by every thread
+    (calls are serialized by a lock), so keep one store per process rather than one per query.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            # WAL lets other processes read while a bulk insert is running
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute("PRAGMA foreign_keys=ON")
+            self._connection.execute(f"PRAGMA cache_size=-{CACHE_KIB}")
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM subscriptions")[0][0]
+
+    def __contains__(self, subscription_id):
+        return bool(self._query("SELECT 1 FROM subscriptions WHERE subscription_id = ?", (subscription_id,)))
+
+    def subscription_ids(self):
+        return [row[0] for row in self._query("SELECT subscription_id FROM subscriptions ORDER BY id")]
+
+    def add(self, catalog, subscription_id, start_date, program_name, test_frequency, payment_plan, duration=None):
+        """
+        Adds one subscription. `duration` follows batch_schedule: None keeps the plan's own duration.
+        """
+        return self.add_many(catalog, [subscription_id], [start_date], [program_name], [test_frequency],
+                             [payment_plan], [duration])
+
+    def add_many(self, catalog, subscription_ids, start_dates, program_names, test_frequencies, payment_plans,
+                 durations=None):
+        """
+        Adds many subscriptions in one transaction, with the same arguments as batch_schedule plus their ids.
+
+        The tests are scheduled by batch_schedule (the rules of calculate_schedule) and bulk inserted.
+        Returns the BatchSchedule. Raises ValueError, without adding anything, if an id is already stored.
+        """
+        subscription_ids = [str(subscription_id) for subscription_id in subscription_ids]
+        if len(set(subscription_ids)) != len(subscription_ids):
+            raise ValueError("Duplicate subscription ids")
+        start_dates = np.asarray(start_dates, dtype='datetime64[D]')
+        schedule = batch_schedule(catalog, start_dates, program_names, test_frequencies, payment_plans, durations)
+        plans = [catalog.get(*key) for key in zip(program_names, test_frequencies, payment_plans)]
+
+        # Rows grouped by subscription, so the tests go in the clustered table in key order
+        test_days = schedule.test_dates.astype(np.int64)
+
+        with self._lock:
+            connection = self._connection
+            # Taking the write lock up front keeps the ids below free until the commit
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                program_ids = self._program_ids({plan.program_name for plan in plans})
+                first_id = connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM subscriptions").fetchone()[0]
+                connection.executemany(
+                    "INSERT INTO subscriptions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    zip(
+                        range(first_id, first_id + len(plans)),
+                        subscription_ids,
+                        (program_ids[plan.program_name] for plan in plans),
+                        (plan.test_frequency for plan in plans),
+                        (plan.payment_plan for plan in plans),
+                        start_dates.astype(np.int64).tolist(),
+                        schedule.duration_months.tolist(),
+                        schedule.price_per_panel.tolist(),
+                        (plan.fingerprint for plan in plans),
+                    )
+                )
+                program_of_row = [program_ids[plan.program_name] for plan in plans]
+                connection.executemany(
+                    "INSERT INTO tests VALUES (?, ?, ?, ?)",
+                    zip(
+                        (schedule.test_row + first_id).tolist(),
+                        test_days.tolist(),
+                        (program_of_row[row] for row in schedule.test_row.tolist()),
+                        schedule.test_prices.tolist(),
+                    )
+                )
+            except sqlite3.IntegrityError as e:
+                connection.execute("ROLLBACK")
+                raise ValueError(f"A subscription is already stored: {e}") from None
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        return schedule
+
+    def replace_schedules(self, plan, rows, start_days, durations, num_tests, test_days, test_prices):
+        """
+        Replaces, in one transaction, the tests of stored subscriptions of `plan` (a catalog PlanRecord)
+        with newly computed ones, and records their duration, price and plan fingerprint.
+
+        `rows` are store row ids as returned by plan_subscriptions, `test_days` and `test_prices` the
+        new tests grouped by row, `num_tests` how many each row has. Subscriptions removed in the
+        meantime, or whose row id now holds another subscription (different start day), are skipped.
+        Returns the number of subscriptions updated.
+        """
+        rows = np.asarray(rows, dtype=np.int64).tolist()
+        start_days = np.asarray(start_days, dtype=np.int64).tolist()
+        durations = np.asarray(durations, dtype=np.int64).tolist()
+        test_row = np.repeat(np.arange(len(rows)), num_tests)
+
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                program_id = self._program_ids({plan.program_name})[plan.program_name]
+                updated = np.zeros(len(rows), dtype=bool)
+                for i, (row, start_day, duration) in enumerate(zip(rows, start_days, durations)):
+                    updated[i] = connection.execute(
+                        """
+                        UPDATE subscriptions SET duration_months = ?, price_per_panel = ?, plan_fingerprint = ?
+                        WHERE id = ? AND start_day = ?
+                        """,
+                        (duration, plan.price_per_panel, plan.fingerprint, row, start_day)
+                    ).rowcount
+                updated_rows = [row for row, done in zip(rows, updated.tolist()) if done]
+                connection.executemany("DELETE FROM tests WHERE subscription = ?", ((row,) for row in updated_rows))
+                kept = updated[test_row]
+                connection.executemany(
+                    "INSERT INTO tests VALUES (?, ?, ?, ?)",
+                    zip(
+                        np.asarray(rows, dtype=np.int64)[test_row[kept]].tolist(),
+                        np.asarray(test_days, dtype=np.int64)[kept].tolist(),
+                        [program_id] * int(kept.sum()),
+                        np.asarray(test_prices, dtype=np.float64)[kept].tolist(),
+                    )
+                )
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        return len(updated_rows)
+
+    def _program_ids(self, program_names):
+        """
+        {name: id} of the given programs, adding the new ones. Called with the lock held.
+        """
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO programs (name) VALUES (?)", ((name,) for name in program_names)
+        )
+        return dict(self._connection.execute("SELECT name, id FROM programs").fetchall())
+
+    def _program_id(self, program_name):
+        """
+        Id of a program for queries, -1 if no subscription ever had it.
+        """
+        rows = self._query("SELECT id FROM programs WHERE name = ?", (program_name,))
+        return rows[0][0] if rows else -1
+
+    def remove(self, subscription_id):
+        """
+        Removes a subscription and its tests. Raises KeyError if it is unknown.
+        """
+        with self._lock:
+            deleted = self._connection.execute(
+                "DELETE FROM subscriptions WHERE subscription_id = ?", (subscription_id,)
+            ).rowcount
+        if not deleted:
+            raise KeyError(subscription_id)
+
+    def tests_due(self, first_day, last_day, program_name=None, limit=None):
+        """
+        Tests from `first_day` to `last_day` (both inclusive) as DueTest tuples, by date.
+        """
+        sql = """
+            SELECT t.test_day, s.subscription_id, p.name, s.frequency, s.plan, t.price
+            FROM tests t
+            JOIN subscriptions s ON s.id = t.subscription
+            JOIN programs p ON p.id = t.program
+            WHERE t.test_day BETWEEN ? AND ?
+        """
+        parameters = [_day(first_day), _day(last_day)]
+        if program_name is not None:
+            sql += " AND t.program = ?"
+            parameters.append(self._program_id(program_name))
+        sql += " ORDER BY t.test_day"
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+        rows = self._query(sql, parameters)
+        dates = np.array([row[0] for row in rows], dtype='datetime64[D]').tolist()
+        return [DueTest(date, *row[1:]) for date, row in zip(dates, rows)]
+
+    def revenue(self, first_day, last_day, program_name=None):
+        """
+        Returns (number of tests, revenue) from `first_day` to `last_day`, both inclusive.
+        """
+        sql = "SELECT COUNT(*), COALESCE(SUM(price), 0) FROM tests WHERE test_day BETWEEN ? AND ?"
+        parameters = [_day(first_day), _day(last_day)]
+        if program_name is not None:
+            sql += " AND program = ?"
+            parameters.append(self._program_id(program_name))
+        num_tests, revenue = self._query(sql, parameters)[0]
+        return num_tests, revenue
+
+    def revenue_by_program(self, first_day, last_day):
+        """
+        {program: (number of tests, revenue)} from `first_day` to `last_day`, both inclusive.
+        """
+        rows = self._query(
+            """
+            SELECT p.name, COUNT(*), SUM(t.price) FROM tests t JOIN programs p ON p.id = t.program
+            WHERE t.test_day BETWEEN ? AND ? GROUP BY t.program ORDER BY p.name
+            """,
+            (_day(first_day), _day(last_day))
+        )
+        return {program: (num_tests, revenue) for program, num_tests, revenue in rows}
+
+    def plan_subscriptions(self, catalog, changed_only=False):
+        """
+        Stored subscriptions of every plan of `catalog`, grouped by plan in catalog order and by id within a plan.
+
+        Returns (plan keys, subscriptions per plan, subscription ids, store row ids, start days, durations).
+        With `changed_only`, only subscriptions made on another version of their plan (a different plan
+        fingerprint) are returned. Subscriptions of plans the catalog no longer has are left out.
+        """
+        program_ids = dict(self._query("SELECT name, id FROM programs"))
+        keys, counts, rows = [], [], []
+        for plan in catalog:
+            if plan.program_name not in program_ids:
+                continue
+            sql = """
+                SELECT subscription_id, id, start_day, duration_months FROM subscriptions
+                WHERE program = ? AND frequency = ? AND plan = ?
+            """
+            parameters = [program_ids[plan.program_name], plan.test_frequency, plan.payment_plan]
+            if changed_only:
+                sql += " AND plan_fingerprint != ?"
+                parameters.append(plan.fingerprint)
+            plan_rows = self._query(sql + " ORDER BY id", parameters)
+            if plan_rows:
+                keys.append(plan.key)
+                counts.append(len(plan_rows))
+                rows.extend(plan_rows)
+
+        subscription_ids = [row[0] for row in rows]
+        columns = np.array([row[1:] for row in rows], dtype=np.int64).reshape(len(rows), 3)
+        return keys, np.array(counts, dtype=np.int64), subscription_ids, columns[:, 0], columns[:, 1], columns[:, 2]
+
+    def daily_counts(self, first_day, last_day, program_name=None):
+        """
+        Returns (days, tests) for every day from `first_day` to `last_day`, both inclusive.
+        Counted in SQL over the tests of that window only.
+        """
+        first, last = _day(first_day), _day(last_day)
+        sql = "SELECT test_day, COUNT(*) FROM tests WHERE test_day BETWEEN ? AND ?"
+        parameters = [first, last]
+        if program_name is not None:
+            sql += " AND program = ?"
+            parameters.append(self._program_id(program_name))
+        rows = self._query(sql + " GROUP BY test_day", parameters)
+
+        tests = np.zeros(max(0, last - first + 1), dtype=np.int64)
+        if rows:
+            test_days, counts = np.array(rows, dtype=np.int64).T
+            tests[test_days - first] = counts
+        days = np.arange(first, first + len(tests)).astype('datetime64[D]')
+        return days, tests
+
+
+@functools.lru_cache(maxsize=None)
+def default_store():
+    """
+    Store at `STORE_PATH`, one per process: the apps share its connection instead of reconnecting on every rerun.
+    """
+    return SubscriptionStore(STORE_PATH)
+
+
+def main(argv=None):
+    from bulk_quote import read_chunks
+    from pricing_core import load_catalog
+
+    parser = argparse.ArgumentParser(description="Load customers into the subscription store.")
+    parser.add_argument('input', help="CSV or Parquet file in the bulk_quote input format")
+    parser.add_argument('--db', default=STORE_PATH, help="SQLite database file")
+    parser.add_argument('--chunksize', type=int, default=100_000, help="Customers per transaction")
+    args = parser.parse_args(argv)
+
+    store = SubscriptionStore(args.db)
+    catalog = load_catalog()
+    start = time.perf_counter()
+    added = 0
+    for chunk in read_chunks(args.input, args.chunksize):
+        schedule = store.add_many(
+            catalog,
+            chunk['customer_id'],
+            pd.to_datetime(chunk['start_date'], format='ISO8601').to_numpy(dtype='datetime64[D]'),
+            chunk['program'].to_numpy(),
+            chunk['frequency'].to_numpy(),
+            chunk['plan'].to_numpy(),
+            pd.to_numeric(chunk['duration']).to_numpy(dtype=np.float64)
+        )
+        added += len(chunk)
+        print(f"{added} subscriptions, {len(schedule.test_dates)} tests in the last chunk")
+    print(f"Loaded {added} subscriptions in {time.perf_counter() - start:.1f}s, {len(store)} in the store")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.parquet
+
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def schedule_table(test_dates, test_prices, test_details=None):
+    """
+    Test schedule as an Arrow table with 'Test Date' (date32) and 'Cost' columns, plus 'Test Detail' if given.
+
+    `test_prices` is one price for all tests or one per test. Missing details are left empty.
+    The columns are built straight from the arrays, so displaying and exporting share the same buffers.
+    """
+    dates = np.asarray(test_dates, dtype='datetime64[D]')
+    columns = {
+        'Test Date': pa.array(dates, type=pa.date32()),
+        'Cost': pa.array(np.broadcast_to(np.asarray(test_prices, dtype=np.float64), dates.shape)),
+    }
+    if test_details is not None:
+        details = list(test_details[:len(dates)])
+        columns['Test Detail'] = pa.array(details + [""] * (len(dates) - len(details)), type=pa.string())
+    return pa.table(columns)
+
+
+def export_table(table, file_format):
+    """
+    Serializes an Arrow table to CSV or Parquet bytes, writing directly from its buffers.
+    """
+    sink = pa.BufferOutputStream()
+    if file_format == 'CSV':
+        pyarrow.csv.write_csv(table, sink)
+    elif file_format == 'Parquet':
+        pyarrow.parquet.write_table(table, sink)
+    else:
+        raise ValueError(f"Unknown export format {file_format!r}")
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,16 @@
+import json
+
+from benchmark import BASELINE_PATH, build_timeline, figure_cases, figure_metrics
+from pricing_core import load_catalog
+
+
+def test_figures_within_baseline():
+    # Sizes only: unlike the timings of benchmark_baseline.json, they don't depend on the machine
+    catalog = load_catalog()
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+
+    for name, plan, duration in figure_cases(catalog):
+        metrics = figure_metrics(build_timeline(catalog, plan, duration))
+        assert metrics['traces'] <= baseline[name]['traces'], name
+        assert metrics['payload_bytes'] <= baseline[name]['payload_bytes'], name
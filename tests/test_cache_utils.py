@@ -0,0 +1,143 @@
+import json
+import threading
+import time
+
+import pytest
+
+from cache_utils import LRUCache
+from pricing_core import CatalogWatcher
+from pricing_core.programs import load_programs
+
+NUM_THREADS = 8
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def call_from_threads(cache, key, compute):
+    """
+    Calls `cache.get_or_compute(key, compute)` from NUM_THREADS threads at once. Returns the results and
+    exceptions by thread, once all threads are done.
+    """
+    results = [None] * NUM_THREADS
+    errors = [None] * NUM_THREADS
+
+    def call(i):
+        try:
+            results[i] = cache.get_or_compute(key, compute)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(NUM_THREADS)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_misses_compute_once():
+    cache = LRUCache()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(threading.get_ident())
+        release.wait()
+        return object()
+
+    threads, results, errors = call_from_threads(cache, 'key', compute)
+    # Hold the computation until every other thread waits for it
+    wait_for(lambda: cache.stats()['waits'] == NUM_THREADS - 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert errors == [None] * NUM_THREADS
+    assert all(result is results[0] for result in results)
+    stats = cache.stats()
+    assert (stats['misses'], stats['waits'], stats['in_flight'], stats['size']) == (1, NUM_THREADS - 1, 0, 1)
+    assert cache.get_or_compute('key', compute) is results[0]
+    assert len(calls) == 1
+
+
+def test_error_propagates_to_waiters():
+    cache = LRUCache()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(threading.get_ident())
+        release.wait()
+        raise ValueError("bad plan")
+
+    threads, results, errors = call_from_threads(cache, 'key', compute)
+    wait_for(lambda: cache.stats()['waits'] == NUM_THREADS - 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(isinstance(error, ValueError) and str(error) == "bad plan" for error in errors)
+    stats = cache.stats()
+    assert (stats['errors'], stats['in_flight'], stats['size']) == (1, 0, 0)
+    # Failures are not cached: the next call computes again
+    assert cache.get_or_compute('key', lambda: 'ok') == 'ok'
+
+
+def test_eviction_respects_max_bytes():
+    cache = LRUCache(maxsize=100, max_bytes=100, sizeof=len)
+
+    for i in range(5):
+        cache.get_or_compute(i, lambda: b'x' * 30)
+        assert cache.nbytes <= cache.max_bytes
+    # Only the 3 most recent fit
+    assert list(cache._entries) == [2, 3, 4]
+    assert cache.stats()['evictions'] == 2
+
+    # A hit makes an entry the most recent, so the next eviction skips it
+    cache.get_or_compute(2, lambda: pytest.fail("should be a hit"))
+    cache.get_or_compute(5, lambda: b'x' * 30)
+    assert list(cache._entries) == [4, 2, 5]
+    assert cache.nbytes == 90
+
+    # Bigger than the whole budget on its own: returned, but nothing is evicted for it
+    assert cache.get_or_compute('big', lambda: b'x' * 101) == b'x' * 101
+    assert list(cache._entries) == [4, 2, 5]
+    assert cache.stats()['rejected'] == 1
+
+
+def test_watcher_invalidates_only_stale_fingerprints(tmp_path):
+    programs = load_programs()
+    path = tmp_path / 'programs.json'
+    path.write_text(json.dumps(programs), encoding='utf-8')
+    watcher = CatalogWatcher(str(path), check_interval=0)
+    catalog = watcher.current()
+
+    # Subscribed as in app.py: entries are keyed by the fingerprints of the plans they show first
+    cache = LRUCache()
+    watcher.subscribe(
+        lambda old, new, changed_keys: cache.invalidate(lambda key: not new.fingerprints.issuperset(key[0]))
+    )
+    changed, unchanged = catalog.records[0], catalog.records[1]
+    keys = {
+        'changed': ((changed.fingerprint,), 'timeline'),
+        'unchanged': ((unchanged.fingerprint,), 'timeline'),
+        'both': ((changed.fingerprint, unchanged.fingerprint), 'compare'),
+    }
+    for name, key in keys.items():
+        cache.get_or_compute(key, lambda name=name: name)
+
+    program_name, test_frequency, payment_plan = changed.key
+    programs[program_name][test_frequency][payment_plan]['price_per_panel'] += 1
+    # Longer than before, so the watcher sees a new size even within the file system's time resolution
+    path.write_text(json.dumps(programs, indent=1), encoding='utf-8')
+    assert watcher.reload_if_changed()
+
+    assert keys['unchanged'] in cache._entries
+    assert keys['changed'] not in cache._entries
+    assert keys['both'] not in cache._entries
+    assert len(cache) == 1
@@ -0,0 +1,80 @@
+import datetime
+import random
+
+import pytest
+
+from optimizer_utils import PlanOptimizer
+from pricing_core import add_months, calculate_schedule
+from test_schedule_utils import schedule_catalog
+
+MAX_DURATION_MONTHS = 36
+
+# Week-based runs end with a test on their end date when their days are a multiple of the period:
+# 2023-02-01 plus one month is 28 days, 2024-02-01 plus 3 months 90 days
+START_DATES = [datetime.date(2023, 2, 1), datetime.date(2024, 2, 1), datetime.date(2024, 1, 31)]
+
+
+def brute_force_search(catalog, start_date, horizon_months, min_tests, max_gap_weeks):
+    """
+    PlanOptimizer.search spelled out: every plan at every duration it allows, scheduled one at a time.
+    """
+    horizon_end = add_months(start_date, horizon_months)
+    options = []
+    for plan in catalog:
+        if plan.is_pay_as_you_go:
+            durations = range(horizon_months, MAX_DURATION_MONTHS + 1)
+        else:
+            durations = [plan.duration_months] if plan.duration_months >= horizon_months else []
+        best = None
+        for duration_months in durations:
+            test_dates = calculate_schedule(*plan.key, duration_months, start_date, catalog)[0]
+            horizon_dates = [date for date in test_dates if date <= horizon_end]
+            if not test_dates or len(horizon_dates) < min_tests:
+                continue
+            stops = [start_date] + horizon_dates + [horizon_end]
+            gap_days = max((b - a).days for a, b in zip(stops, stops[1:]))
+            if max_gap_weeks is not None and gap_days > 7 * max_gap_weeks:
+                continue
+            total_cost = sum(plan.rotation(len(test_dates))[1])
+            if best is None or total_cost < best[3]:
+                best = (
+                    plan.key, duration_months, len(test_dates), round(total_cost, 6), len(horizon_dates),
+                    round(gap_days / 7, 6)
+                )
+        if best:
+            options.append(best)
+    return options
+
+
+def as_tuples(options):
+    return [
+        (option.plan.key, option.duration_months, option.num_tests, round(option.total_cost, 6),
+         option.horizon_tests, round(option.max_gap_weeks, 6))
+        for option in options
+    ]
+
+
+@pytest.mark.parametrize('start_date', START_DATES)
+def test_search_matches_brute_force(start_date):
+    catalog = schedule_catalog()
+    optimizer = PlanOptimizer(catalog, start_date, MAX_DURATION_MONTHS)
+    rng = random.Random(20)
+
+    for horizon_months in [1, 2, 3, 6, 12, 13, 24, 36] + [rng.randint(1, MAX_DURATION_MONTHS) for _ in range(4)]:
+        for min_tests, max_gap_weeks in [(0, None), (1, None), (4, None), (5, 4), (1, 6), (3, 13), (2, 27)]:
+            expected = brute_force_search(catalog, start_date, horizon_months, min_tests, max_gap_weeks)
+            options = optimizer.search(horizon_months, min_tests, max_gap_weeks, limit=len(catalog))
+            query = (horizon_months, min_tests, max_gap_weeks)
+            assert sorted(as_tuples(options)) == sorted(expected), query
+            # Cheapest first
+            assert [option[3] for option in as_tuples(options)] == sorted(option[3] for option in expected), query
+
+
+def test_search_counts_test_on_horizon_end():
+    catalog = schedule_catalog()
+    start_date = START_DATES[0]
+    optimizer = PlanOptimizer(catalog, start_date, MAX_DURATION_MONTHS)
+
+    # Every week for a month of exactly 4 weeks: the 4th test falls on the last day
+    option, = [option for option in optimizer.search(1, 4, limit=len(catalog)) if option.plan.key[1] == 'Every week']
+    assert (option.duration_months, option.num_tests, option.horizon_tests, option.max_gap_weeks) == (1, 4, 4, 1)
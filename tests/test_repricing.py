@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+import repricing
+from pricing_core import PricingCatalog, load_catalog
+from pricing_core.programs import load_programs
+from repricing import reprice, synthetic_store
+
+NUM_SUBSCRIPTIONS = 3_000
+CHUNK_SIZE = 40
+# Chunks computed before the interrupted run stops: the first ones are written back to the store, the
+# last one is only checkpointed
+INTERRUPT_AFTER = 5
+
+
+def old_catalog(program_name):
+    """
+    The current catalog, with every plan of `program_name` priced differently.
+    """
+    programs = load_programs()
+    for plans in programs[program_name].values():
+        for plan in plans.values():
+            plan['price_per_panel'] += 10
+    return PricingCatalog(programs)
+
+
+def stored_state(store):
+    subscriptions = store._query(
+        """
+        SELECT subscription_id, duration_months, price_per_panel, plan_fingerprint FROM subscriptions
+        ORDER BY subscription_id
+        """
+    )
+    tests = store._query(
+        """
+        SELECT s.subscription_id, t.test_day, t.price FROM tests t JOIN subscriptions s ON s.id = t.subscription
+        ORDER BY s.subscription_id, t.test_day
+        """
+    )
+    totals = store._query(
+        """
+        SELECT s.subscription_id, COUNT(*), SUM(t.price) FROM tests t JOIN subscriptions s ON s.id = t.subscription
+        GROUP BY s.subscription_id ORDER BY s.subscription_id
+        """
+    )
+    return subscriptions, tests, totals
+
+
+@pytest.fixture
+def stores(tmp_path):
+    catalog = load_catalog()
+    old = old_catalog(catalog.program_names()[0])
+    clean = synthetic_store(str(tmp_path / 'clean.db'), old, NUM_SUBSCRIPTIONS)
+    resumed = synthetic_store(str(tmp_path / 'resumed.db'), old, NUM_SUBSCRIPTIONS)
+    yield catalog, clean, resumed
+    clean.close()
+    resumed.close()
+
+
+def test_resumed_run_matches_clean_run(stores, tmp_path, monkeypatch):
+    catalog, clean, resumed = stores
+    assert stored_state(clean) == stored_state(resumed)
+
+    expected = reprice(clean, catalog, workers=0, chunk_size=CHUNK_SIZE, checkpoint_dir=str(tmp_path / 'clean'))
+    num_chunks = int(np.ceil(np.bincount(expected.plan_row) / CHUNK_SIZE).sum())
+    assert num_chunks > INTERRUPT_AFTER + 1
+    assert 0 < expected.updated == len(expected.num_tests) < NUM_SUBSCRIPTIONS
+
+    reprice_chunk = repricing._reprice_chunk
+    computed = []
+
+    def interrupted(*task):
+        count = reprice_chunk(*task)
+        computed.append(task)
+        if len(computed) == INTERRUPT_AFTER:
+            # After the checkpoint, before the parent writes the chunk back
+            raise KeyboardInterrupt
+        return count
+
+    monkeypatch.setattr(repricing, '_reprice_chunk', interrupted)
+    checkpoint_dir = str(tmp_path / 'resumed')
+    with pytest.raises(KeyboardInterrupt):
+        reprice(resumed, catalog, workers=0, chunk_size=CHUNK_SIZE, checkpoint_dir=checkpoint_dir)
+    assert len(computed) == INTERRUPT_AFTER
+    written_back = sum(stop - start for _, _, start, stop in computed[:-1])
+
+    result = reprice(resumed, catalog, workers=0, chunk_size=CHUNK_SIZE, checkpoint_dir=checkpoint_dir)
+    # The chunks written back drop out, the checkpointed one is loaded, only the rest is computed
+    assert result.updated == expected.updated - written_back
+    assert len(computed) == num_chunks
+    assert stored_state(resumed) == stored_state(clean)
+
+    # The store totals are those of the clean run's quotes. Subscriptions without tests have no row
+    totals = {subscription_id: (count, total) for subscription_id, count, total in stored_state(resumed)[2]}
+    for subscription_id, num_tests, total_cost in zip(expected.subscription_ids, expected.num_tests,
+                                                       expected.total_cost):
+        assert totals.get(subscription_id, (0, 0)) == (num_tests, pytest.approx(total_cost))
+
+    for store in (clean, resumed):
+        again = reprice(store, catalog, workers=0, chunk_size=CHUNK_SIZE, checkpoint_dir=str(tmp_path / 'again'))
+        assert (again.plan_keys, len(again.num_tests), again.updated) == ([], 0, 0)
+    assert len(computed) == num_chunks
@@ -0,0 +1,141 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from pricing_core import PricingCatalog, calculate_schedule, get_month_offset, load_programs
+from schedule_utils import batch_schedule, batch_totals, month_offsets, plan_cash_flow, plan_quote
+from timeline_utils import MAX_DURATION_MONTHS
+
+NUM_ROWS = 2000
+
+# Start dates where calendar arithmetic goes wrong first: month ends, leap days and year ends
+EDGE_DATES = [
+    datetime.date(2024, 1, 31),
+    datetime.date(2024, 2, 29),
+    datetime.date(2023, 2, 28),
+    datetime.date(2024, 4, 30),
+    datetime.date(2024, 8, 31),
+    datetime.date(2024, 12, 31),
+    datetime.date(2100, 2, 28),
+    datetime.date(2000, 2, 29),
+]
+
+
+# Plans the programs table doesn't have (yet) but the schedule rules cover: week-based plans without a
+# fixed duration, with and without a tests cap, and a rotation with a separately priced panel
+EXTRA_PROGRAMS = {
+    'Weekly Program': {
+        'Every week': {
+            'Pay as you go': {'price_per_panel': 20, 'period_weeks': 1},
+        },
+        'Every 2 weeks': {
+            'Pay as you go': {'price_per_panel': 35, 'period_weeks': 2, 'tests_included': 30},
+        },
+        'Every 5 weeks': {
+            'Pay as you go': {
+                'price_per_panel': 90,
+                'period_weeks': 5,
+                'test_details': ['Panel A', 'Panel B', 'Panel C'],
+                'panel_prices': {'Panel B': 140.5},
+            },
+        },
+    },
+}
+
+
+def schedule_catalog():
+    return PricingCatalog({**load_programs(), **EXTRA_PROGRAMS})
+
+
+def random_rows(catalog, seed):
+    """
+    (plan, start date, custom duration) rows over every catalog plan: pay-as-you-go plans get a random
+    duration, the others their own.
+    """
+    rng = np.random.default_rng(seed)
+    plans = list(catalog)
+    first_day = datetime.date(1990, 1, 1)
+    rows = []
+    for i in range(NUM_ROWS):
+        plan = plans[i % len(plans)]
+        if i % 4 == 0:
+            start_date = EDGE_DATES[int(rng.integers(len(EDGE_DATES)))]
+        else:
+            start_date = first_day + datetime.timedelta(days=int(rng.integers(60 * 365)))
+        duration = int(rng.integers(1, MAX_DURATION_MONTHS + 1)) if plan.is_pay_as_you_go else None
+        rows.append((plan, start_date, duration))
+    return rows
+
+
+def reference(catalog, plan, start_date, duration):
+    """
+    Test dates, test prices and duration of a row, date by date through calculate_schedule.
+    """
+    test_dates, _, _, duration_months, _ = calculate_schedule(*plan.key, duration, start_date, catalog)
+    return test_dates, plan.rotation(len(test_dates))[1], duration_months
+
+
+def batch_args(catalog, rows):
+    plans, start_dates, durations = zip(*rows)
+    return (
+        catalog,
+        start_dates,
+        [plan.program_name for plan in plans],
+        [plan.test_frequency for plan in plans],
+        [plan.payment_plan for plan in plans],
+        durations,
+    )
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_batch_paths_match_calculate_schedule(seed):
+    catalog = schedule_catalog()
+    rows = random_rows(catalog, seed)
+    totals = batch_totals(*batch_args(catalog, rows))
+    schedule = batch_schedule(*batch_args(catalog, rows))
+    ends = np.cumsum(schedule.num_tests)
+
+    for i, (plan, start_date, duration) in enumerate(rows):
+        test_dates, test_prices, duration_months = reference(catalog, plan, start_date, duration)
+        row = (plan.key, start_date, duration)
+
+        assert totals.num_tests[i] == len(test_dates), row
+        assert totals.total_cost[i] == pytest.approx(sum(test_prices)), row
+        assert totals.duration_months[i] == duration_months, row
+
+        row_dates = schedule.test_dates[ends[i] - schedule.num_tests[i]:ends[i]].tolist()
+        assert row_dates == test_dates, row
+        assert schedule.total_cost[i] == pytest.approx(sum(test_prices)), row
+
+
+@pytest.mark.parametrize('seed', [3])
+def test_plan_paths_match_calculate_schedule(seed):
+    catalog = schedule_catalog()
+    for plan, start_date, duration in random_rows(catalog, seed):
+        test_dates, test_prices, duration_months = reference(catalog, plan, start_date, duration)
+        row = (plan.key, start_date, duration)
+
+        num_tests, total_cost = plan_quote(plan, start_date, duration_months)
+        assert num_tests == len(test_dates), row
+        assert total_cost == pytest.approx(sum(test_prices)), row
+
+        expected = np.zeros(duration_months + 1)
+        for date, price in zip(test_dates, test_prices):
+            expected[(date.year - start_date.year) * 12 + date.month - start_date.month] += price
+        np.testing.assert_allclose(plan_cash_flow(plan, start_date, duration_months), expected, err_msg=str(row))
+
+
+def test_month_offsets_match_get_month_offset():
+    rng = np.random.default_rng(4)
+    start_dates = EDGE_DATES + [
+        datetime.date(1990, 1, 1) + datetime.timedelta(days=int(day)) for day in rng.integers(60 * 365, size=500)
+    ]
+    for start_date in start_dates:
+        # Dates before the start too, which fall outside the calendar index of the start month
+        dates = [start_date + datetime.timedelta(days=int(day)) for day in rng.integers(-1500, 4000, size=20)]
+        expected = month_offsets(np.datetime64(start_date, 'D'), np.array(dates, dtype='datetime64[D]'))
+        np.testing.assert_allclose(
+            [get_month_offset(start_date, date) for date in dates], expected, rtol=0, atol=1e-12,
+            err_msg=str(start_date)
+        )
@@ -0,0 +1,64 @@
+import datetime
+import json
+import random
+
+import plotly.io
+import pytest
+
+from pricing_core import load_catalog
+from timeline_utils import (
+    DETAIL_MONTHS, MAX_DURATION_MONTHS, TIMELINE_COLORS, DurationTimeline, build_plan_figure
+)
+
+# Upper bounds of the figure sent to the browser, per duration: (traces, JSON payload bytes). Drawing
+# one trace per month and per test marker, as the apps used to, takes over a hundred traces and
+# several times the payload at 120 months
+FIGURE_LIMITS = {
+    12: (2, 12_000),
+    120: (4, 24_000),
+}
+
+
+def densest_pay_as_you_go_plan(catalog):
+    plans = [plan for plan in catalog if plan.is_pay_as_you_go]
+    return min(plans, key=lambda plan: plan.period_months or plan.period_weeks / 4)
+
+
+@pytest.mark.parametrize('duration_months', sorted(FIGURE_LIMITS))
+@pytest.mark.parametrize('start_date', [datetime.date(2024, 2, 29), datetime.date(2025, 12, 31)])
+def test_plan_figure_size(duration_months, start_date):
+    catalog = load_catalog()
+    plan = densest_pay_as_you_go_plan(catalog)
+    max_traces, max_payload = FIGURE_LIMITS[duration_months]
+
+    fig = build_plan_figure(catalog, *plan.key, duration_months, start_date, TIMELINE_COLORS)
+
+    assert len(fig.data) <= max_traces
+    assert len(fig.to_json()) <= max_payload
+
+
+def figure_spec(fig):
+    # Arrays compared by value, and an empty annotation list the same as none
+    spec = json.loads(plotly.io.json.to_json_plotly(fig.to_plotly_json()))
+    if not spec['layout'].get('annotations'):
+        spec['layout'].pop('annotations', None)
+    return spec
+
+
+def test_duration_timeline_matches_fresh_figure():
+    catalog = load_catalog()
+    plan = densest_pay_as_you_go_plan(catalog)
+    start_date = datetime.date(2024, 1, 31)
+    rng = random.Random(18)
+    # Random slider moves, then back and forth across the edges: one month, the quarter and year views
+    durations = [rng.randint(1, MAX_DURATION_MONTHS) for _ in range(40)] + [
+        1, 2, DETAIL_MONTHS - 1, DETAIL_MONTHS, DETAIL_MONTHS + 1, DETAIL_MONTHS - 1, 2 * DETAIL_MONTHS,
+        2 * DETAIL_MONTHS + 1, 2 * DETAIL_MONTHS - 1, MAX_DURATION_MONTHS, MAX_DURATION_MONTHS - 1, 1,
+        MAX_DURATION_MONTHS,
+    ]
+
+    timeline = DurationTimeline(catalog, plan, start_date, 12, TIMELINE_COLORS)
+    for duration_months in durations:
+        timeline.set_duration(duration_months)
+        expected = build_plan_figure(catalog, *plan.key, duration_months, start_date, TIMELINE_COLORS)
+        assert figure_spec(timeline.fig) == figure_spec(expected), duration_months
@@ -0,0 +1,531 @@
+import numpy as np
+import plotly.graph_objects as go
+
+from pricing_core import calculate_schedule, calendar_index, get_month_offset, get_year_boundaries, iter_test_dates
+
+# Palette of app.py, also used to prebuild its figures
+TIMELINE_COLORS = {
+    'background': '#FDF5E6',
+    'timeline': '#FF7F50',
+    'month_markers': '#2E8B57',
+    'test_markers': '#FF4500',
+    'arrow_color': 'blue',
+    'text': '#333333'
+}
+
+# Longest duration offered by the duration sliders
+MAX_DURATION_MONTHS = 120
+
+# Timelines spanning more months open zoomed out on quarters or years, with buttons to switch to the
+# per-month and per-test view (DETAIL_WINDOW_MONTHS wide, panned in the browser)
+DETAIL_MONTHS = 36
+DETAIL_WINDOW_MONTHS = 24
+
+
+def _extend_months(start_date, all_months, test_offsets):
+    """
+    Appends month labels until every test offset falls on the timeline.
+    """
+    needed = int(max(test_offsets, default=0)) + 1
+    if needed <= len(all_months):
+        return list(all_months)
+    return calendar_index.month_labels(start_date, needed - 1)
+
+
+def year_boundary_layout(year_boundaries):
+    """
+    Returns the dashed boundary lines and year labels as layout shape and annotation dicts.
+    """
+    shapes = []
+    annotations = []
+    for year, month_index in year_boundaries.items():
+        shapes.append(dict(
+            type="line",
+            x0=month_index - 0.5, y0=-0.5, x1=month_index - 0.5, y1=1.5,
+            line=dict(color='gray', width=2, dash='dash')
+        ))
+        annotations.append(dict(
+            x=month_index - 0.5, y=1.6,
+            text=str(year),
+            showarrow=False,
+            font=dict(size=12, color='gray'),
+            xanchor='center',
+            yanchor='bottom'
+        ))
+    return shapes, annotations
+
+
+def build_timeline_figure(start_date, all_months, year_boundaries, test_offsets, test_texts, test_hovertexts,
+                          colors, text_position='bottom center', icon=None):
+    """
+    Draws the timeline with one trace for all month markers and one trace for all test markers.
+
+    Returns the figure and the month labels, extended when a test falls past the end of the timeline.
+    If `icon` is given it is drawn above every test marker in one extra text trace.
+    """
+    all_months = _extend_months(start_date, all_months, test_offsets)
+    test_offsets = list(test_offsets)
+
+    data = [
+        go.Scatter(
+            x=list(range(len(all_months))), y=[0] * len(all_months),
+            mode='markers+text',
+            marker=dict(size=20, color=colors['month_markers'], symbol='circle'),
+            text=all_months,
+            textposition='bottom center',
+            textfont=dict(size=14, color=colors['text']),
+            hoverinfo='none'
+        ),
+        go.Scatter(
+            x=test_offsets, y=[1] * len(test_offsets),
+            mode='markers+text',
+            marker=dict(size=15, color=colors['test_markers'], symbol='triangle-down'),
+            text=list(test_texts),
+            textposition=text_position,
+            textfont=dict(size=12, color=colors['text']),
+            hoverinfo='text',
+            hovertext=list(test_hovertexts)
+        ),
+    ]
+    if icon is not None:
+        data.append(go.Scatter(
+            x=test_offsets, y=[1.5] * len(test_offsets),
+            mode='text',
+            text=[icon] * len(test_offsets),
+            textfont=dict(size=24),
+            hoverinfo='skip'
+        ))
+
+    shapes, annotations = year_boundary_layout(year_boundaries)
+    timeline = dict(
+        type="line",
+        x0=-0.5, y0=0, x1=len(all_months)-0.5, y1=0,
+        line=dict(color=colors['timeline'], width=10)
+    )
+    fig = go.Figure(data=data, layout=dict(shapes=[timeline] + shapes, annotations=annotations))
+    return fig, all_months
+
+
+def _plan_markers(plan, start_date, test_dates, first_test=0):
+    """
+    Offsets, texts, hover texts and calendar months (since the start month) of the test markers of a
+    single-plan timeline, whose first test is the plan's test `first_test`. `test_dates` can be any
+    iterable and is only walked once.
+    """
+    test_offsets, test_texts, test_hovertexts, test_months = [], [], [], []
+    for date in test_dates:
+        test_offsets.append(get_month_offset(start_date, date))
+        test_hovertexts.append(date.strftime('%B %d, %Y'))
+        test_months.append((date.year - start_date.year) * 12 + date.month - start_date.month)
+    if plan.has_panel_rotation:
+        panels, prices = plan.rotation(len(test_offsets), first_test)
+        test_texts = [f"🧰 ${price}\n {panel}" for panel, price in zip(panels, prices)]
+    else:
+        test_texts = ["🧰"] * len(test_offsets)
+    return test_offsets, test_texts, test_hovertexts, test_months
+
+
+def aggregation_period(last_month):
+    """
+    Months per marker of the opening view of a timeline spanning months 0..last_month:
+    1 (every month), 3 (calendar quarters) or 12 (calendar years).
+    """
+    if last_month <= DETAIL_MONTHS:
+        return 1
+    return 3 if last_month <= 2 * DETAIL_MONTHS else 12
+
+
+def _aggregate_traces(start_date, num_months, test_months, test_prices, period, colors):
+    """
+    Zoomed-out traces: one marker per calendar quarter or year of the timeline, and one test marker per
+    quarter or year with tests, labelled with their number. Markers sit in the middle of their months.
+    """
+    first_month = start_date.year * 12 + start_date.month - 1
+    buckets = (first_month + np.arange(num_months)) // period
+    bucket_ids, bucket_starts = np.unique(buckets, return_index=True)
+    bucket_ends = np.append(bucket_starts[1:], num_months) - 1
+    centers = ((bucket_starts + bucket_ends) / 2).tolist()
+    if period == 12:
+        labels = [str(year) for year in bucket_ids.tolist()]
+    else:
+        labels = [f"Q{quarter % 4 + 1} {quarter // 4}" for quarter in bucket_ids.tolist()]
+
+    test_buckets = (first_month + np.asarray(test_months, dtype=np.int64)) // period
+    test_bucket_index = np.searchsorted(bucket_ids, test_buckets)
+    counts = np.bincount(test_bucket_index, minlength=len(bucket_ids))
+    amounts = np.bincount(test_bucket_index, weights=test_prices, minlength=len(bucket_ids))
+    with_tests = np.flatnonzero(counts).tolist()
+
+    return [
+        go.Scatter(
+            x=centers, y=[0] * len(centers),
+            mode='markers+text',
+            marker=dict(size=20, color=colors['month_markers'], symbol='circle'),
+            text=labels,
+            textposition='bottom center',
+            textfont=dict(size=14, color=colors['text']),
+            hoverinfo='none'
+        ),
+        go.Scatter(
+            x=[centers[i] for i in with_tests], y=[1] * len(with_tests),
+            mode='markers+text',
+            marker=dict(size=15, color=colors['test_markers'], symbol='triangle-down'),
+            text=[f"🧰 ×{counts[i]}" for i in with_tests],
+            textposition='bottom center',
+            textfont=dict(size=12, color=colors['text']),
+            hoverinfo='text',
+            hovertext=[
+                f"{labels[i]}: {counts[i]} tests, ${amounts[i]:,.2f}" for i in with_tests
+            ]
+        ),
+    ]
+
+
+def _detail_buttons(num_months, period, num_detail_traces=2):
+    """
+    Buttons switching between the zoomed-out view (the last two traces) and the months and tests (the
+    `num_detail_traces` before them). Plotly applies them in the browser, without a round trip to the server.
+    """
+    return [dict(
+        type='buttons',
+        direction='right',
+        active=0,
+        showactive=True,
+        x=0, xanchor='left',
+        y=1.02, yanchor='bottom',
+        buttons=[
+            dict(
+                label='Years' if period == 12 else 'Quarters',
+                method='update',
+                args=[
+                    {'visible': [False] * num_detail_traces + [True, True]},
+                    {'xaxis.range': [-0.5, num_months - 0.5], 'xaxis.fixedrange': True, 'dragmode': False}
+                ]
+            ),
+            dict(
+                label='Months and tests (drag to pan)',
+                method='update',
+                args=[
+                    {'visible': [True] * num_detail_traces + [False, False]},
+                    {'xaxis.range': [-0.5, DETAIL_WINDOW_MONTHS - 0.5], 'xaxis.fixedrange': False, 'dragmode': 'pan'}
+                ]
+            ),
+        ]
+    )]
+
+
+def add_zoomed_out_view(fig, start_date, num_months, test_months, test_prices, colors):
+    """
+    Makes a timeline of `num_months` months open on quarters or years when it is too long to read
+    month by month (see aggregation_period): its traces are hidden, for the buttons to switch back to.
+
+    `test_months` are the calendar months (since the start month) of the tests and `test_prices`
+    their prices. Returns the aggregation period; the figure is left as it is when it is 1.
+    """
+    period = aggregation_period(num_months - 1)
+    if period > 1:
+        num_detail_traces = len(fig.data)
+        fig.update_traces(visible=False)
+        fig.add_traces(_aggregate_traces(start_date, num_months, test_months, test_prices, period, colors))
+        fig.update_layout(updatemenus=_detail_buttons(num_months, period, num_detail_traces))
+    return period
+
+
+def build_plan_figure(catalog, program_name, test_frequency, payment_plan, custom_duration, start_date, colors):
+    """
+    Single-plan timeline of app.py, with its title and layout.
+
+    Long timelines open on quarters or years (see aggregation_period); the per-month and per-test
+    traces are still sent, hidden, for the browser to switch to.
+    """
+    plan = catalog.get(program_name, test_frequency, payment_plan)
+    duration_months = plan.duration_months if custom_duration is None else custom_duration
+    all_months = calendar_index.month_labels(start_date, duration_months)
+
+    year_boundaries = get_year_boundaries(start_date, duration_months)
+    test_offsets, test_texts, test_hovertexts, test_months = _plan_markers(
+        plan, start_date, iter_test_dates(plan, start_date, duration_months)
+    )
+
+    fig, all_months = build_timeline_figure(
+        start_date,
+        all_months,
+        year_boundaries,
+        test_offsets=test_offsets,
+        test_texts=test_texts,
+        test_hovertexts=test_hovertexts,
+        colors=colors
+    )
+
+    fig.update_layout(
+        title=dict(
+            text=f"{program_name} - {test_frequency} - {payment_plan}",
+            font=dict(size=24, color=colors['text']),
+            x=0.5
+        ),
+        showlegend=False,
+        height=600,
+        plot_bgcolor=colors['background'],
+        paper_bgcolor=colors['background'],
+        xaxis=dict(
+            showticklabels=True,
+            showgrid=False,
+            zeroline=False,
+            range=[-0.5, len(all_months)-0.5],
+            fixedrange=True
+        ),
+        yaxis=dict(
+            showticklabels=False,
+            showgrid=False,
+            zeroline=False,
+            range=[-1, 2],
+            fixedrange=True
+        ),
+        dragmode=False,
+        margin=dict(l=20, r=20, t=100, b=20)
+    )
+
+    add_zoomed_out_view(fig, start_date, len(all_months), test_months, plan.rotation(len(test_months))[1], colors)
+    return fig
+
+
+def _common_prefix(old, new):
+    size = min(len(old), len(new))
+    for i in range(size):
+        if old[i] != new[i]:
+            return i
+    return size
+
+
+class DurationTimeline:
+    """
+    Single-plan timeline (same figure as build_plan_figure) whose duration is changed in place.
+
+    set_duration() diffs the new schedule against the one on display and only drops or appends the
+    months, year boundaries and tests past the part they have in common, instead of rebuilding the figure.
+    The small zoomed-out traces of long timelines are replaced as a whole; the figure is only rebuilt when
+    the duration crosses between a detailed and a zoomed-out timeline.
+    """
+
+    def __init__(self, catalog, plan, start_date, duration_months, colors):
+        self.catalog = catalog
+        self.plan = plan
+        self.start_date = start_date
+        self.colors = colors
+        self._build(duration_months)
+
+    def _build(self, duration_months):
+        self.fig = build_plan_figure(self.catalog, *self.plan.key, duration_months, self.start_date, self.colors)
+        self._duration = duration_months
+        self._test_dates, _, _, _, _ = calculate_schedule(
+            *self.plan.key, duration_months, self.start_date, self.catalog
+        )
+        self._test_months = _plan_markers(self.plan, self.start_date, self._test_dates)[3]
+        self._boundaries = list(get_year_boundaries(self.start_date, duration_months).items())
+        self._num_months = len(self.fig.data[0].x)
+        self._period = aggregation_period(self._num_months - 1)
+        # Plain dicts: plotly objects of a layout array become unusable once the array is replaced
+        self._shapes = tuple(shape.to_plotly_json() for shape in self.fig.layout.shapes)
+        self._annotations = tuple(annotation.to_plotly_json() for annotation in self.fig.layout.annotations)
+
+    @property
+    def duration_months(self):
+        return self._duration
+
+    def set_duration(self, duration_months):
+        """
+        Updates the figure to `duration_months`. Returns the number of (months, year boundaries, tests)
+        that were removed and added.
+        """
+        test_dates, _, all_months, duration_months, _ = calculate_schedule(
+            *self.plan.key, duration_months, self.start_date, self.catalog
+        )
+        boundaries = list(get_year_boundaries(self.start_date, duration_months).items())
+
+        months, tests = self.fig.data[0], self.fig.data[1]
+        kept_tests = _common_prefix(self._test_dates, test_dates)
+        kept_boundaries = _common_prefix(self._boundaries, boundaries)
+        added_dates = test_dates[kept_tests:]
+        added_offsets, added_texts, added_hovertexts, added_months = _plan_markers(
+            self.plan, self.start_date, added_dates, kept_tests
+        )
+        test_offsets = list(tests.x[:kept_tests]) + added_offsets
+        # Month labels all start at the start month, so they only grow or shrink at the end
+        num_months = len(_extend_months(self.start_date, all_months, test_offsets))
+        kept_months = min(self._num_months, num_months)
+        period = aggregation_period(num_months - 1)
+        if (period > 1) != (self._period > 1):
+            changes = {
+                'months': (self._num_months, num_months),
+                'year_boundaries': (len(self._boundaries), len(boundaries)),
+                'tests': (len(self._test_dates), len(test_dates)),
+            }
+            self._build(duration_months)
+            return changes
+        test_months = self._test_months[:kept_tests] + added_months
+        added_shapes, added_annotations = year_boundary_layout(dict(boundaries[kept_boundaries:]))
+
+        if num_months != self._num_months:
+            labels = calendar_index.month_labels(self.start_date, num_months - 1)
+            months.x = list(range(num_months))
+            months.y = [0] * num_months
+            months.text = list(months.text[:kept_months]) + labels[kept_months:]
+            self.fig.layout.xaxis.range = [-0.5, num_months - 0.5]
+        # The first shape is the timeline itself, the others the year boundaries
+        timeline = dict(self._shapes[0], x1=num_months - 0.5)
+        if kept_boundaries != len(self._boundaries) or added_shapes:
+            self._shapes = (timeline,) + self._shapes[1:1 + kept_boundaries] + tuple(added_shapes)
+            self._annotations = self._annotations[:kept_boundaries] + tuple(added_annotations)
+            self.fig.layout.shapes = self._shapes
+            self.fig.layout.annotations = self._annotations
+        elif num_months != self._num_months:
+            self._shapes = (timeline,) + self._shapes[1:]
+            self.fig.layout.shapes[0].x1 = timeline['x1']
+        if kept_tests != len(self._test_dates) or added_dates:
+            tests.x = test_offsets
+            tests.y = [1] * len(test_offsets)
+            tests.text = list(tests.text[:kept_tests]) + added_texts
+            tests.hovertext = list(tests.hovertext[:kept_tests]) + added_hovertexts
+        if period > 1:
+            aggregates = _aggregate_traces(
+                self.start_date, num_months, test_months, self.plan.rotation(len(test_months))[1], period,
+                self.colors
+            )
+            for trace, aggregate in zip(self.fig.data[2:], aggregates):
+                for name in ('x', 'y', 'text', 'hovertext'):
+                    if trace[name] != aggregate[name]:
+                        trace[name] = aggregate[name]
+            if (num_months, period) != (self._num_months, self._period):
+                self.fig.layout.updatemenus = _detail_buttons(num_months, period)
+
+        changes = {
+            'months': (self._num_months - kept_months, num_months - kept_months),
+            'year_boundaries': (len(self._boundaries) - kept_boundaries, len(boundaries) - kept_boundaries),
+            'tests': (len(self._test_dates) - kept_tests, len(test_dates) - kept_tests),
+        }
+        self._duration = duration_months
+        self._test_dates = test_dates
+        self._test_months = test_months
+        self._boundaries = boundaries
+        self._num_months = num_months
+        self._period = period
+        return changes
+
+
+def build_comparison_figure(start_date, plan_labels, duration_months, test_rows, test_offsets, test_texts,
+                            test_hovertexts, colors):
+    """
+    Draws one timeline row per plan on a shared month axis, still with one trace per marker kind.
+
+    `test_rows` gives the plan (index into `plan_labels`) of every test; rows are drawn top to bottom.
+    """
+    all_months = calendar_index.month_labels(start_date, max(duration_months, int(max(test_offsets, default=0))))
+    num_plans = len(plan_labels)
+    # First plan on top
+    test_y = [num_plans - row for row in test_rows]
+
+    data = [
+        go.Scatter(
+            x=list(range(len(all_months))), y=[0] * len(all_months),
+            mode='markers+text',
+            marker=dict(size=20, color=colors['month_markers'], symbol='circle'),
+            text=all_months,
+            textposition='bottom center',
+            textfont=dict(size=14, color=colors['text']),
+            hoverinfo='none'
+        ),
+        go.Scatter(
+            x=list(test_offsets), y=test_y,
+            mode='markers+text',
+            marker=dict(size=15, color=colors['test_markers'], symbol='triangle-down'),
+            text=list(test_texts),
+            textposition='top center',
+            textfont=dict(size=12, color=colors['text']),
+            hoverinfo='text',
+            hovertext=list(test_hovertexts)
+        ),
+    ]
+
+    shapes = [dict(
+        type="line",
+        x0=-0.5, y0=0, x1=len(all_months)-0.5, y1=0,
+        line=dict(color=colors['timeline'], width=10)
+    )]
+    for y in range(1, num_plans + 1):
+        shapes.append(dict(
+            type="line",
+            x0=-0.5, y0=y, x1=len(all_months)-0.5, y1=y,
+            line=dict(color=colors['timeline'], width=2, dash='dot')
+        ))
+    boundary_shapes, annotations = year_boundary_layout(calendar_index.year_boundaries(start_date, len(all_months) - 1))
+    for shape, annotation in zip(boundary_shapes, annotations):
+        shape['y1'] = num_plans + 0.5
+        annotation['y'] = num_plans + 0.6
+
+    fig = go.Figure(data=data, layout=dict(shapes=shapes + boundary_shapes, annotations=annotations))
+    fig.update_layout(
+        showlegend=False,
+        height=200 + 90 * num_plans,
+        plot_bgcolor=colors['background'],
+        paper_bgcolor=colors['background'],
+        xaxis=dict(
+            showticklabels=False,
+            showgrid=False,
+            zeroline=False,
+            range=[-0.5, len(all_months)-0.5],
+            fixedrange=True
+        ),
+        yaxis=dict(
+            tickvals=list(range(num_plans, 0, -1)),
+            ticktext=list(plan_labels),
+            showgrid=False,
+            zeroline=False,
+            range=[-1, num_plans + 1],
+            fixedrange=True
+        ),
+        dragmode=False,
+        margin=dict(l=20, r=20, t=100, b=20)
+    )
+    return fig
+
+
+def build_calendar_heatmap(days, tests, colors):
+    """
+    Draws daily test counts as a calendar: one column per week (Monday first), one row per weekday.
+
+    `days` are consecutive datetime64[D] days and `tests` the number of tests on each of them.
+    """
+    days = np.asarray(days, dtype='datetime64[D]')
+    tests = np.asarray(tests)
+    # 1970-01-01 was a Thursday, so Monday is weekday 0 after shifting by 3 days
+    first_weekday = (days[0].astype(np.int64) + 3) % 7 if len(days) else 0
+    num_weeks = -(-(first_weekday + len(days)) // 7)
+
+    grid = np.full(num_weeks * 7, np.nan)
+    grid[first_weekday:first_weekday + len(days)] = tests
+    labels = np.full(num_weeks * 7, '', dtype=object)
+    labels[first_weekday:first_weekday + len(days)] = [
+        f"{day:%a %B %d, %Y}: {count} tests" for day, count in zip(days.tolist(), tests.tolist())
+    ]
+    week_starts = days[0] - first_weekday + 7 * np.arange(num_weeks) if len(days) else days
+
+    fig = go.Figure(go.Heatmap(
+        x=week_starts,
+        y=['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
+        z=grid.reshape(num_weeks, 7).T,
+        text=labels.reshape(num_weeks, 7).T,
+        hoverinfo='text',
+        colorscale=[[0, colors['background']], [1, colors['test_markers']]],
+        xgap=2,
+        ygap=2,
+        colorbar=dict(title='Tests')
+    ))
+    fig.update_layout(
+        plot_bgcolor=colors['background'],
+        paper_bgcolor=colors['background'],
+        height=320,
+        yaxis=dict(autorange='reversed', fixedrange=True),
+        xaxis=dict(showgrid=False, fixedrange=True),
+        margin=dict(l=20, r=20, t=60, b=20)
+    )
+    return fig
@@ -0,0 +1,117 @@
+import functools
+import json
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class StageTimings:
+    """
+    Thread-safe rolling store of stage durations, keeping the last `maxlen` records.
+
+    Each record has the stage name, its wall time, when it ended and any numeric metrics attached to it
+    (trace and shape counts, payload sizes, rows...). Summaries and exports cover the records in the window.
+    """
+
+    def __init__(self, maxlen=2000):
+        self.maxlen = maxlen
+        self._records = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._records)
+
+    def record(self, stage, seconds, **metrics):
+        with self._lock:
+            self._records.append(dict(stage=stage, seconds=seconds, time=time.time(), **metrics))
+
+    @contextmanager
+    def stage(self, name, **metrics):
+        """
+        Times the body of a `with` block. The yielded dict can be filled with metrics known only at the end.
+        """
+        start = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            self.record(name, time.perf_counter() - start, **metrics)
+
+    def timed(self, name):
+        """
+        Decorator recording every call of a function as stage `name`.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def summary(self):
+        """
+        Per stage: number of records, mean/median/p95/max milliseconds and the last value of each metric.
+        """
+        stages = {}
+        for record in self.records():
+            stages.setdefault(record['stage'], []).append(record)
+
+        summary = {}
+        for stage, records in stages.items():
+            durations = sorted(record['seconds'] * 1000 for record in records)
+            summary[stage] = {
+                'count': len(durations),
+                'mean_ms': statistics.fmean(durations),
+                'p50_ms': statistics.median(durations),
+                'p95_ms': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                'max_ms': durations[-1],
+            }
+            for record in records:
+                summary[stage].update(
+                    (key, value) for key, value in record.items() if key not in ('stage', 'seconds', 'time')
+                )
+        return summary
+
+    def to_json(self):
+        return json.dumps({'summary': self.summary(), 'records': self.records()}, indent=2)
+
+    def to_prometheus(self, prefix='app'):
+        """
+        Prometheus text exposition: one summary of stage durations, plus a gauge per numeric metric (last value).
+        """
+        summary = self.summary()
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Wall time of each stage over the recent window.",
+            f"# TYPE {prefix}_stage_duration_seconds summary",
+        ]
+        gauges = {}
+        for stage, stats in summary.items():
+            label = stage.replace('\\', '\\\\').replace('"', '\\"')
+            for quantile, key in (('0.5', 'p50_ms'), ('0.95', 'p95_ms'), ('1', 'max_ms')):
+                lines.append(
+                    f'{prefix}_stage_duration_seconds{{stage="{label}",quantile="{quantile}"}} {stats[key] / 1000:.6g}'
+                )
+            lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{label}"}} '
+                         f'{stats["mean_ms"] * stats["count"] / 1000:.6g}')
+            lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{label}"}} {stats["count"]}')
+            for key, value in stats.items():
+                if key.endswith('_ms') or key == 'count':
+                    continue
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges.setdefault(key, []).append((label, value))
+
+        for key, values in sorted(gauges.items()):
+            lines.append(f"# HELP {prefix}_stage_{key} Last recorded {key.replace('_', ' ')} per stage.")
+            lines.append(f"# TYPE {prefix}_stage_{key} gauge")
+            lines.extend(f'{prefix}_stage_{key}{{stage="{label}"}} {value:g}' for label, value in values)
+        return "\n".join(lines) + "\n"